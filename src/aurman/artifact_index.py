@@ -0,0 +1,181 @@
+import os
+import threading
+import time
+from typing import Dict, List, Tuple, Union, Sequence
+
+# package files are named "name-pkgver-pkgrel-arch" followed by PKGEXT, e.g. ".pkg.tar.xz"
+# see: https://www.archlinux.org/pacman/makepkg.conf.5.html
+package_file_extension = ".pkg.tar"
+
+
+def parse_package_file_name(file_name: str) -> Union[Tuple[str, str, str, str], None]:
+    """
+    Parses the name of a package file.
+    e.g. "package1-1:1.0-2-x86_64.pkg.tar.xz" -> ("package1", "1:1.0-2", "x86_64", ".pkg.tar.xz")
+
+    :param file_name:   The name of the file
+    :return:            Tuple containing the name, the version, the arch and the pkgext of the package,
+                        None if the file is not a package file
+    """
+    extension_start = file_name.rfind(package_file_extension)
+    if extension_start == -1 or file_name.endswith(".sig"):
+        return None
+
+    splitted_name = file_name[:extension_start].rsplit("-", 3)
+    if len(splitted_name) != 4 or not all(splitted_name):
+        return None
+
+    name, pkgver, pkgrel, arch = splitted_name
+    return name, "{}-{}".format(pkgver, pkgrel), arch, file_name[extension_start:]
+
+
+def package_files_since(directory: str, names: Sequence[str], version: str, since: float) -> List[str]:
+    """
+    Lists the package files of packages of a version, and their signatures, modified since a point in time,
+    e.g. the files created by a build
+
+    :param directory:   The directory containing the package files
+    :param names:       The names of the packages
+    :param version:     The version of the package files
+    :param since:       The point in time as returned by time.time()
+    :return:            The names of the files, sorted
+    """
+    to_return = []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            artifact = parse_package_file_name(entry.name[:-len(".sig")] if entry.name.endswith(".sig")
+                                               else entry.name)
+            if artifact is not None and artifact[0] in names and artifact[1] == version and entry.is_file() \
+                    and entry.stat().st_mtime >= since:
+                to_return.append(entry.name)
+
+    return sorted(to_return)
+
+
+class ArtifactIndex:
+    """
+    Index of the package files in a directory, e.g. PKGDEST.
+    The directory is being rescanned if the mtime of it changed, only new file names are being parsed.
+    Like git does for racy index entries, the mtime is not trusted if it is close to the time of the last scan,
+    since files may have been added within the same tick of coarse timestamps, e.g. on NFS.
+    Indexes may be used by concurrent builds, hence access is synchronized.
+    """
+    # max difference in seconds between the mtime of the directory and the time of the last scan to rescan anyway
+    racy_interval = 2
+    # the paths of the directories as keys and the indexes as values, see: of_dir
+    indexes: Dict[str, 'ArtifactIndex'] = {}
+    indexes_lock = threading.Lock()
+
+    @staticmethod
+    def of_dir(directory: str) -> 'ArtifactIndex':
+        """
+        Returns the up to date index of a directory
+
+        :param directory:   The path of the directory
+        :return:            The index
+        """
+        directory = os.path.abspath(directory)
+        with ArtifactIndex.indexes_lock:
+            if directory not in ArtifactIndex.indexes:
+                ArtifactIndex.indexes[directory] = ArtifactIndex(directory)
+
+            index = ArtifactIndex.indexes[directory]
+
+        index.refresh()
+        return index
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.lock = threading.RLock()
+        self.mtime = None
+        # the time of the last scan as returned by time.time()
+        self.scan_time = None
+        # names of the files as keys and the parsed names as values, None for files which are no package files
+        self.files: Dict[str, Union[Tuple[str, str, str, str], None]] = {}
+        # (name, version, arch, pkgext) as keys and the names of the files as values
+        self.artifacts: Dict[Tuple[str, str, str, str], str] = {}
+        # (name, version) as keys and the keys of artifacts as values
+        self.versions: Dict[Tuple[str, str], List[Tuple[str, str, str, str]]] = {}
+
+    def refresh(self):
+        """
+        Rescans the directory, if the mtime of it changed
+        """
+        with self.lock:
+            self.rescan()
+
+    def rescan(self):
+        scan_time = time.time()
+        try:
+            mtime = os.stat(self.directory).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime is not None and mtime == self.mtime \
+                and self.scan_time - mtime / 10 ** 9 > ArtifactIndex.racy_interval:
+            return
+
+        file_names = set()
+        if mtime is not None:
+            with os.scandir(self.directory) as entries:
+                file_names = {entry.name for entry in entries if entry.is_file()}
+
+        for file_name in set(self.files) - file_names:
+            self.remove(file_name)
+        for file_name in file_names:
+            if file_name not in self.files:
+                self.add(file_name)
+
+        self.mtime = mtime
+        self.scan_time = scan_time
+
+    def add(self, file_name: str):
+        artifact = parse_package_file_name(file_name)
+        self.files[file_name] = artifact
+        if artifact is None:
+            return
+
+        self.artifacts[artifact] = file_name
+        self.versions.setdefault(artifact[:2], []).append(artifact)
+
+    def remove(self, file_name: str):
+        artifact = self.files.pop(file_name)
+        if artifact is None:
+            return
+
+        del self.artifacts[artifact]
+        self.versions[artifact[:2]].remove(artifact)
+        if not self.versions[artifact[:2]]:
+            del self.versions[artifact[:2]]
+
+    def find(self, name: str, version: str, arch: str = None, pkgext: str = None) -> Union[str, None]:
+        """
+        Finds the package file of a package
+
+        :param name:        The name of the package
+        :param version:     The version of the package
+        :param arch:        The arch of the package, if None any arch
+        :param pkgext:      The preferred pkgext, if None or not available any pkgext
+        :return:            The name of the package file, None if there is none
+        """
+        with self.lock:
+            found = self.find_unlocked(name, version, arch, pkgext)
+            if found is None:
+                # misses are the normal case for packages to build, hence the directory is only being rescanned
+                # if the mtime changed or is too recent to be trusted
+                self.rescan()
+                found = self.find_unlocked(name, version, arch, pkgext)
+
+            return found
+
+    def find_unlocked(self, name: str, version: str, arch: str = None, pkgext: str = None) -> Union[str, None]:
+        if arch is not None and pkgext is not None and (name, version, arch, pkgext) in self.artifacts:
+            return self.artifacts[(name, version, arch, pkgext)]
+
+        candidates = [artifact for artifact in self.versions.get((name, version), ())
+                      if arch is None or artifact[2] == arch]
+        if not candidates:
+            return None
+
+        candidates.sort(key=lambda artifact: (artifact[3] != pkgext, artifact))
+        return self.artifacts[candidates[0]]
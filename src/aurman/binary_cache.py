@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+from subprocess import run, PIPE, DEVNULL
+from typing import List, Tuple
+
+from aurman.artifact_index import parse_package_file_name
+from aurman.own_exceptions import InvalidInput
+from aurman.utilities import copy_file_atomically
+
+
+class BinaryCache:
+    """
+    Cache of built package files in a directory, which may be shared between machines, e.g. via NFS.
+    The package files of a build are stored in "pkgbase/version-arch-tree hash",
+    the tree hash is the hash of the tracked files of the package dir, hence of the reviewed build files.
+    Entries are published by renaming a complete temporary directory, hence readers never see partial entries.
+    """
+
+    def __init__(self, directory: str):
+        """
+        :param directory:   The directory of the cache
+        """
+        self.directory = directory
+
+    @staticmethod
+    def tree_hash(package_dir: str) -> str:
+        """
+        Hashes the names and the contents of the files of a package dir tracked by git,
+        including uncommitted changes, e.g. by editing the PKGBUILD during the review
+
+        :param package_dir:     The package dir
+        :return:                The hash
+        """
+        ls_files_return = run("git ls-files -z", shell=True, stdout=PIPE, stderr=DEVNULL, cwd=package_dir)
+        if ls_files_return.returncode != 0:
+            logging.error("listing the files of {} failed".format(package_dir))
+            raise InvalidInput("listing the files of {} failed".format(package_dir))
+
+        tree_hash = hashlib.sha256()
+        for file_name in sorted(name for name in ls_files_return.stdout.split(b"\0") if name):
+            tree_hash.update(file_name + b"\0")
+            path = os.path.join(package_dir.encode(), file_name)
+            if os.path.isfile(path):
+                with open(path, "rb") as f:
+                    tree_hash.update(hashlib.sha256(f.read()).digest())
+
+        return tree_hash.hexdigest()
+
+    def entry_dir(self, key: Tuple[str, str, str, str]) -> str:
+        """
+        :param key:     pkgbase, version, arch and tree hash of the build
+        :return:        The path of the entry
+        """
+        pkgbase, version, arch, tree_hash = key
+        return os.path.join(self.directory, pkgbase, "{}-{}-{}".format(version, arch, tree_hash))
+
+    def fetch(self, key: Tuple[str, str, str, str], name: str, build_dir: str) -> List[str]:
+        """
+        Copies the package files of a cached build to the build dir
+
+        :param key:         pkgbase, version, arch and tree hash of the build
+        :param name:        The name of the package which has to be contained
+        :param build_dir:   The dir to copy the package files to
+        :return:            The names of the copied files, empty if the build has not been cached
+        """
+        entry_dir = self.entry_dir(key)
+        try:
+            file_names = sorted(os.listdir(entry_dir))
+        except OSError:
+            return []
+
+        if not [file_name for file_name in file_names if (parse_package_file_name(file_name) or ("",))[0] == name]:
+            return []
+
+        os.makedirs(build_dir, exist_ok=True)
+        for file_name in file_names:
+            copy_file_atomically(os.path.join(entry_dir, file_name), os.path.join(build_dir, file_name))
+
+        return file_names
+
+    def publish(self, key: Tuple[str, str, str, str], build_dir: str, file_names: List[str]):
+        """
+        Publishes the package files of a build, if not yet published
+
+        :param key:         pkgbase, version, arch and tree hash of the build
+        :param build_dir:   The dir containing the package files
+        :param file_names:  The names of the package files
+        """
+        entry_dir = self.entry_dir(key)
+        if not file_names or os.path.isdir(entry_dir):
+            return
+
+        try:
+            os.makedirs(os.path.dirname(entry_dir), exist_ok=True)
+            temporary_dir = tempfile.mkdtemp(dir=os.path.dirname(entry_dir), prefix=".tmp-")
+        except OSError:
+            logging.warning("publishing to the binary cache {} failed".format(self.directory), exc_info=True)
+            return
+
+        try:
+            for file_name in file_names:
+                shutil.copyfile(os.path.join(build_dir, file_name), os.path.join(temporary_dir, file_name))
+            os.chmod(temporary_dir, 0o755)
+            # fails if another process published the entry in the meantime
+            os.rename(temporary_dir, entry_dir)
+        except OSError:
+            logging.debug("publishing {} to the binary cache failed".format(entry_dir), exc_info=True)
+            shutil.rmtree(temporary_dir, ignore_errors=True)
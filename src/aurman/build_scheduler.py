@@ -0,0 +1,295 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Sequence, List, Dict, Set, Callable, Union
+
+from aurman.classes import Package, PossibleTypes, System
+from aurman.coloring import aurman_note, Colors
+from aurman.utilities import strip_versioning_from_name
+
+
+class ResourceGovernor:
+    """
+    Allocates the cores and the memory of the machine to concurrent builds.
+    Builds get the number of granted cores as number of make jobs,
+    new builds are only being admitted if cores are free and enough memory is available.
+    The memory of running builds is reserved, since builds which just started have not allocated it yet.
+    """
+
+    def __init__(self, cores: int = None, memory_per_core: int = 512):
+        """
+        :param cores:               The number of cores to use for building, if None all cores
+        :param memory_per_core:     The memory in MiB a build needs per granted core, 0 to not check the memory
+        """
+        self.cores = max(1, cores if cores is not None else os.cpu_count() or 1)
+        self.free_cores = self.cores
+        self.memory_per_core = memory_per_core
+        self.reserved_memory = 0  # memory in MiB reserved for the running builds
+
+    @staticmethod
+    def memory_available() -> Union[int, None]:
+        """
+        :return:    The available memory in MiB, None if unknown
+        """
+        try:
+            with open("/proc/meminfo", "r") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        return int(line.split()[1]) // 1024
+        except (OSError, ValueError, IndexError):
+            logging.debug("reading the available memory failed", exc_info=True)
+
+        return None
+
+    def acquire(self, builds_left: int, jobs: int, running: int) -> Union[int, None]:
+        """
+        Grants cores to a new build.
+        The cores are shared equally between the builds which may run concurrently,
+        but a build never gets more cores than are free.
+        The first build is always being admitted.
+
+        :param builds_left:     The number of builds which have not been started yet
+        :param jobs:            The max number of concurrent builds
+        :param running:         The number of running builds
+        :return:                The number of granted cores, None if the build may not start yet
+        """
+        if running and self.free_cores < 1:
+            return None
+
+        share = self.cores // max(1, min(jobs, builds_left + running))
+        cores = max(1, min(self.free_cores, share))
+
+        if running and self.memory_per_core:
+            memory_available = self.memory_available()
+            if memory_available is not None \
+                    and memory_available - self.reserved_memory < cores * self.memory_per_core:
+                return None
+
+        self.free_cores -= cores
+        self.reserved_memory += cores * self.memory_per_core
+        return cores
+
+    def release(self, cores: int):
+        """
+        Releases the cores and the memory of a finished build
+
+        :param cores:   The number of cores granted to the build
+        """
+        self.free_cores += cores
+        self.reserved_memory -= cores * self.memory_per_core
+
+
+class BuildScheduler:
+    """
+    Builds the aur packages of install chunks concurrently and installs the chunks in order.
+    see: System.calc_install_chunks
+
+    The build of an aur package may start as soon as every chunk containing a package,
+    which the aur package (transitively) depends on, has been installed.
+    Hence the next packages may be built while a chunk is being installed.
+    Installing is never concurrent and happens in the order of the chunks.
+
+    Every pkgbase is built once, by the build of its first chunk.
+    Consecutive aur chunks are installed in one pacman transaction,
+    as long as none of their builds needs one of the earlier chunks of the transaction to be installed,
+    hence the split packages of a pkgbase are usually installed at once.
+    """
+
+    def __init__(self, chunks: Sequence[Sequence[Package]], installed_system: System, jobs: int = 1,
+                 governor: ResourceGovernor = None, pipelined: bool = False):
+        """
+        :param chunks:              The install chunks
+        :param installed_system:    The currently installed system
+        :param jobs:                The max number of concurrent builds
+        :param governor:            Allocates the cores and the memory to concurrent builds,
+                                    if None all cores without checking the memory
+        :param pipelined:           If True, builds run while installing even with a single job.
+                                    Always the case for more than one job
+        """
+        self.chunks = [chunk for chunk in chunks if chunk]
+        self.installed_system = installed_system
+        self.jobs = max(1, jobs)
+        self.pipelined = pipelined or self.jobs > 1
+        self.governor = governor if governor is not None else ResourceGovernor(memory_per_core=0)
+        # indices of the aur chunks to build as keys and the indices of the chunks to install before building as values
+        self.build_after: Dict[int, int] = {}
+        # indices of the other aur chunks as keys and the indices of the chunks building their pkgbase as values
+        self.built_by: Dict[int, int] = {}
+        # the indices of the chunks to install at once, in order
+        self.install_batches: List[List[int]] = []
+
+        first_index_of_pkgbase: Dict[str, int] = {}
+        for i, chunk in enumerate(self.chunks):
+            if chunk[0].type_of is PossibleTypes.REPO_PACKAGE:
+                continue
+
+            package = chunk[0]
+            if package.pkgbase in first_index_of_pkgbase:
+                self.built_by[i] = first_index_of_pkgbase[package.pkgbase]
+            else:
+                first_index_of_pkgbase[package.pkgbase] = i
+                self.build_after[i] = self.last_needed_chunk(i)
+
+        # the packages of the last batch, packages conflicting each other have to be installed separately
+        batch_system = System(())
+        for i, chunk in enumerate(self.chunks):
+            if chunk[0].type_of is not PossibleTypes.REPO_PACKAGE and self.install_batches:
+                batch = self.install_batches[-1]
+                # the pkgbase of a chunk built by an earlier chunk has already been built before installing the batch
+                if self.chunks[batch[0]][0].type_of is not PossibleTypes.REPO_PACKAGE \
+                        and (i in self.built_by or self.build_after[i] < batch[0]) \
+                        and not batch_system.conflicting_with(chunk[0]):
+                    batch.append(i)
+                    batch_system.append_packages(chunk)
+                    continue
+
+            self.install_batches.append([i])
+            batch_system = System(chunk)
+
+    def providers_in_chunks(self, dep_name: str, before: int) -> List[int]:
+        """
+        :param dep_name:    The name of a dep without versioning
+        :param before:      Only chunks before this index are considered
+        :return:            The indices of the chunks containing packages named like or providing the dep
+        """
+        to_return = []
+        for i, chunk in enumerate(self.chunks[:before]):
+            for package in chunk:
+                if package.name == dep_name \
+                        or dep_name in (strip_versioning_from_name(provide) for provide in package.provides):
+                    to_return.append(i)
+                    break
+
+        return to_return
+
+    def last_needed_chunk(self, index: int) -> int:
+        """
+        Calculates the index of the last chunk which has to be installed before the aur package
+        of the chunk with the given index may be built.
+        The deps are followed transitively through the installed packages and the packages of the chunks,
+        versioning is ignored, hence the result may be later than needed but never earlier.
+
+        :param index:   The index of the aur chunk
+        :return:        The index of the last needed chunk, -1 if no chunk is needed
+        """
+        last_needed = -1
+        seen_deps: Set[str] = set()
+        deps_to_check = [strip_versioning_from_name(dep) for dep in self.chunks[index][0].relevant_deps()]
+
+        while deps_to_check:
+            dep_name = deps_to_check.pop()
+            if dep_name in seen_deps:
+                continue
+            seen_deps.add(dep_name)
+
+            providers: List[Package] = []
+            for i in self.providers_in_chunks(dep_name, index):
+                last_needed = max(last_needed, i)
+                providers.extend(self.chunks[i])
+            if dep_name in self.installed_system.all_packages_dict:
+                providers.append(self.installed_system.all_packages_dict[dep_name])
+            providers.extend(self.installed_system.provides_dict.get(dep_name, ()))
+
+            for provider in providers:
+                if provider.name != dep_name \
+                        and dep_name not in (strip_versioning_from_name(provide) for provide in provider.provides):
+                    continue
+                deps_to_check.extend(strip_versioning_from_name(dep)
+                                     for dep in provider.relevant_deps(only_depends=True))
+
+        return last_needed
+
+    @staticmethod
+    def log_file(package: Package) -> str:
+        """
+        :param package:     The package
+        :return:            The path of the file the output of concurrent builds of the package is written to
+        """
+        return os.path.join(Package.cache_dir, package.pkgbase, "aurman_build_{}.log".format(package.name))
+
+    def build_index(self, index: int) -> int:
+        """
+        :param index:   The index of an aur chunk
+        :return:        The index of the chunk building the pkgbase of the chunk
+        """
+        return self.built_by.get(index, index)
+
+    def batch_packages(self, batch: Sequence[int]) -> List[Package]:
+        """
+        :param batch:   The indices of the chunks to install at once
+        :return:        The packages of the chunks
+        """
+        return [package for i in batch for package in self.chunks[i]]
+
+    def run(self, build: Callable[[Package, Union[str, None], Union[int, None]], None],
+            install: Callable[[Sequence[Package]], None]):
+        """
+        Builds and installs the chunks
+
+        :param build:       Builds an aur package, gets the package, the log file to write the output to,
+                            None if the output should be shown, and the number of make jobs,
+                            None to use the configured MAKEFLAGS
+        :param install:     Installs a repo chunk or the packages of consecutive aur chunks at once
+        """
+        if not self.pipelined:
+            for batch in self.install_batches:
+                for i in batch:
+                    if i in self.build_after:
+                        build(self.chunks[i][0], None, None)
+                install(self.batch_packages(batch))
+            return
+
+        installed_until = -1
+        futures: Dict[int, Future] = {}
+        # running builds as keys and the cores granted to them as values
+        running: Dict[Future, int] = {}
+
+        def submit_ready_builds():
+            for future in [future for future in running if future.done()]:
+                self.governor.release(running.pop(future))
+
+            for i in sorted(self.build_after):
+                if len(running) >= self.jobs:
+                    return
+                if i in futures or self.build_after[i] > installed_until:
+                    continue
+                cores = self.governor.acquire(len(self.build_after) - len(futures), self.jobs, len(running))
+                if cores is None:
+                    return
+
+                package = self.chunks[i][0]
+                # a single build at a time keeps the configured MAKEFLAGS
+                if self.jobs == 1:
+                    aurman_note("building {}, log: {}".format(Colors.BOLD(Colors.LIGHT_MAGENTA(package.name)),
+                                                              BuildScheduler.log_file(package)))
+                    futures[i] = executor.submit(build, package, BuildScheduler.log_file(package), None)
+                else:
+                    aurman_note("building {} with {} cores, log: {}"
+                                "".format(Colors.BOLD(Colors.LIGHT_MAGENTA(package.name)), cores,
+                                          BuildScheduler.log_file(package)))
+                    futures[i] = executor.submit(build, package, BuildScheduler.log_file(package), cores)
+                running[futures[i]] = cores
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            try:
+                for batch in self.install_batches:
+                    submit_ready_builds()
+
+                    if self.chunks[batch[0]][0].type_of is not PossibleTypes.REPO_PACKAGE:
+                        builds = {self.build_index(i) for i in batch}
+                        while not all(i in futures and futures[i].done() for i in builds):
+                            wait(running, return_when=FIRST_COMPLETED)
+                            submit_ready_builds()
+
+                        for i in builds:
+                            futures[i].result()
+                        # start the next builds before installing
+                        submit_ready_builds()
+
+                    install(self.batch_packages(batch))
+                    installed_until = batch[-1]
+            except BaseException:
+                for future in futures.values():
+                    future.cancel()
+                logging.debug("waiting for running builds to finish")
+                raise
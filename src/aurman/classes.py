@@ -1,16 +1,83 @@
 import logging
+import multiprocessing
 import os
 import re
+import sys
+import threading
+import time
+from collections.abc import MutableMapping
+from struct import error as struct_error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from enum import Enum, auto
 from subprocess import run, PIPE, DEVNULL
 from typing import Sequence, List, Tuple, Set, Union, Dict, Iterable
 
+from aurman.artifact_index import ArtifactIndex, package_files_since, parse_package_file_name
 from aurman.aur_utilities import is_devel, get_aur_info
+from aurman.binary_cache import BinaryCache
 from aurman.coloring import aurman_status, aurman_note, aurman_error, aurman_question, Colors
 from aurman.own_exceptions import InvalidInput, ConnectionProblem
-from aurman.parsing_config import packages_from_other_sources
-from aurman.utilities import strip_versioning_from_name, split_name_with_versioning, version_comparison, ask_user
-from aurman.wrappers import expac, makepkg, pacman, pacman_conf
+from aurman.package_index import PackageIndex, write_package_index, string_fields, list_fields
+from aurman.pacman_db import read_local_db, read_sync_dbs, local_db_state, sync_dbs_state
+from aurman.parsing_config import packages_from_other_sources, AurmanConfig, read_pacman_conf, \
+    read_makepkg_conf, write_makepkg_conf, replace_jobs_in_makeflags
+from aurman.utilities import strip_versioning_from_name, split_name_with_versioning, version_comparison, ask_user, \
+    parse_srcinfo, git_head_commit, copy_file_atomically
+from aurman.wrappers import expac, makepkg, pacman, pacman_conf, repo_add
+
+
+def intern_string(string: Union[str, None]) -> Union[str, None]:
+    """
+    Interns a string, see: https://docs.python.org/3/library/sys.html#sys.intern
+
+    :param string:  The string to intern, may be None
+    :return:        The interned string, None for None
+    """
+    if string is None:
+        return None
+    return sys.intern(string)
+
+
+def intern_strings(strings: Union[Iterable[str], None]) -> Union[Tuple[str, ...], None]:
+    """
+    Interns strings, see: intern_string
+
+    :param strings:     The strings to intern, may be None
+    :return:            Tuple containing the interned strings, None for None
+    """
+    if strings is None:
+        return None
+    return tuple([sys.intern(string) for string in strings])
+
+
+class LazyField:
+    """
+    Field of a package which is being parsed on first access.
+    The raw value is stored in the slot with the name of the field prefixed by "_".
+    Raw values may be strings containing whitespace separated values, e.g. from expac,
+    or sequences of strings. Parsed values are tuples of interned strings.
+    """
+
+    def __set_name__(self, owner, name: str):
+        self.name = name
+        self.slot = getattr(owner, "_{}".format(name))
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+
+        value = self.slot.__get__(instance, owner)
+        if value is None or type(value) is tuple:
+            return value
+
+        if isinstance(value, str):
+            value = value.split()
+        value = intern_strings(value)
+        self.slot.__set__(instance, value)
+        return value
+
+    def __set__(self, instance, value: Union[str, Sequence[str], None]):
+        self.slot.__set__(instance, value)
 
 
 class PossibleTypes(Enum):
@@ -145,7 +212,23 @@ class DepAlgoNotProvided(DepAlgoFoundProblems):
 class Package:
     """
     Class representing Arch Linux packages
+    Thousands of packages share the same names of deps etc., hence the strings are interned
+    and the sequences are stored as tuples.
+    Fields most packages never need are parsed on first access, see LazyField.
     """
+    __slots__ = ('name', 'version', 'depends', '_conflicts', '_optdepends', '_provides', '_replaces', 'pkgbase',
+                 'install_reason', 'makedepends', 'checkdepends', 'type_of', 'repo', '_groups', 'last_modified')
+
+    # the attributes of packages
+    attributes = ('name', 'version', 'depends', 'conflicts', 'optdepends', 'provides', 'replaces', 'pkgbase',
+                  'install_reason', 'makedepends', 'checkdepends', 'type_of', 'repo', 'groups', 'last_modified')
+
+    conflicts = LazyField()
+    optdepends = LazyField()
+    provides = LazyField()
+    replaces = LazyField()
+    groups = LazyField()
+
     # default editor path
     default_editor_path = os.environ.get("VISUAL", os.environ.get("EDITOR", os.path.join("/usr", "bin", "nano")))
     # directory of the cache
@@ -155,6 +238,27 @@ class Package:
     # but a specific version is needed
     # default is FALSE, may be set to TRUE via a command line flag
     optimistic_versioning: bool = False
+    # versions read from .SRCINFO, (pkgbase, commit hash, mtime of the PKGBUILD) as keys, see: version_from_srcinfo
+    srcinfo_versions: Dict[Tuple[str, str, int], str] = {}
+    # names of the packages of the pkgbases read from .SRCINFO, same keys as srcinfo_versions
+    srcinfo_pkgnames: Dict[Tuple[str, str, int], List[str]] = {}
+    # max number of aur repos being fetched at the same time, see: fetch_pkgbuilds
+    max_fetch_workers: int = 8
+    # if True, the aur repos in the cache dir share one bare object store, see: get_shared_object_store
+    # default is FALSE, may be set to TRUE via the aurman config
+    shared_object_store: bool = False
+    # name of the shared object store in the cache dir
+    shared_object_store_name = ".aur_objects.git"
+    # serializes creating and pruning the shared object store, fetches into it run concurrently
+    shared_object_store_lock = threading.Lock()
+    # if set, built package files are being looked up in and published to this cache, see: build
+    # may be set via the aurman config
+    binary_cache: 'BinaryCache' = None
+    # if set, built package files are being added to this pacman repository database, see: add_to_local_repo
+    # may be set via the aurman config
+    local_repo: str = None
+    # serializes repo-add calls of concurrent builds
+    local_repo_lock = threading.Lock()
 
     @staticmethod
     def get_packages_from_aur(packages_names: Sequence[str]) -> List['Package']:
@@ -184,7 +288,8 @@ class Package:
                 'pkgbase': package_dict['PackageBase'],
                 'makedepends': package_dict.get('MakeDepends', []),
                 'checkdepends': package_dict.get('CheckDepends', []),
-                'groups': package_dict.get('Groups', [])
+                'groups': package_dict.get('Groups', []),
+                'last_modified': package_dict.get('LastModified')
             }
 
             if is_devel(name):
@@ -261,19 +366,7 @@ class Package:
 
         :return:    a list containing the known repos (ordered by occurrence in pacman.conf)
         """
-        pacman_conf_return = run("pacman-conf", shell=True, stdout=PIPE, stderr=DEVNULL, universal_newlines=True)
-
-        if pacman_conf_return.returncode != 0:
-            logging.error("pacman-conf not available")
-            raise InvalidInput("pacman-conf not available")
-
-        to_return: List[str] = []
-
-        for line in pacman_conf_return.stdout.strip().splitlines():
-            if line.startswith("[") and line.endswith("]"):
-                to_return.append(line[1:len(line) - 1])
-
-        return to_return
+        return list(read_pacman_conf().repos)
 
     @staticmethod
     def get_packages_from_expac(expac_operation: str, packages_names: Sequence[str], packages_type: PossibleTypes) -> \
@@ -309,10 +402,10 @@ class Package:
                 'version': splitted_line[1],
                 'depends': splitted_line[2].split(),
                 'conflicts': splitted_line[3].split(),
-                'optdepends': splitted_line[4].split(),
-                'provides': splitted_line[5].split(),
-                'replaces': splitted_line[6].split(),
-                'groups': splitted_line[8].split()
+                'optdepends': splitted_line[4],
+                'provides': splitted_line[5],
+                'replaces': splitted_line[6],
+                'groups': splitted_line[8]
             }
 
             if packages_type is PossibleTypes.AUR_PACKAGE or packages_type is PossibleTypes.DEVEL_PACKAGE:
@@ -355,15 +448,27 @@ class Package:
 
             return_dict[to_expand['name']] = Package(**to_expand)
 
-        # check if all repos the user gave us are actually known
+        Package.check_packages_from_other_repos(return_dict, repo_dict)
+
+        return list(return_dict.values())
+
+    @staticmethod
+    def check_packages_from_other_repos(repo_packages_dict: Dict[str, 'Package'], repo_dict: Dict[str, str]):
+        """
+        Checks if all repos the user gave us via the aurman config are actually known
+
+        :param repo_packages_dict:  Dict containing the names of the repo packages as keys and the packages as values
+        :param repo_dict:           Dict containing the names of packages as keys
+                                    and the repos to install those packages from as values
+        """
         for repo_package_name in repo_dict:
-            if repo_package_name not in return_dict:
+            if repo_package_name not in repo_packages_dict:
                 aurman_error("Package {} "
                              "not known in any repo".format(Colors.BOLD(Colors.LIGHT_MAGENTA(repo_package_name))))
                 raise InvalidInput("Package {} "
                                    "not known in any repo".format(Colors.BOLD(Colors.LIGHT_MAGENTA(repo_package_name))))
 
-            package_repo = return_dict[repo_package_name].repo
+            package_repo = repo_packages_dict[repo_package_name].repo
             if package_repo != repo_dict[repo_package_name]:
                 aurman_error("Package {} not found in repo {}"
                              "".format(Colors.BOLD(Colors.LIGHT_MAGENTA(repo_package_name)),
@@ -372,27 +477,90 @@ class Package:
                                    "".format(Colors.BOLD(Colors.LIGHT_MAGENTA(repo_package_name)),
                                              Colors.BOLD(Colors.LIGHT_MAGENTA(repo_dict[repo_package_name]))))
 
+    @staticmethod
+    def get_packages_from_sync_dbs() -> List['Package']:
+        """
+        Generates and returns the packages of the sync databases of pacman.
+        Falls back to expac -S in case of sync databases not readable by aurman.
+
+        :return:    List containing the packages
+        """
+        repos = Package.get_known_repos()
+        # packages the user wants to install from another repo
+        repo_dict = packages_from_other_sources()[1]
+
+        try:
+            sync_packages = read_sync_dbs(tuple(repos))
+        except InvalidInput:
+            logging.info("falling back to expac for reading the sync databases")
+            return Package.get_packages_from_expac("-S", (), PossibleTypes.REPO_PACKAGE)
+
+        # the repos are ordered by precedence, hence the first occurrence of a name wins,
+        # unless we explicitly want a package from a specific repo
+        return_dict = {}
+        for repo in repos:
+            for to_expand in sync_packages[repo]:
+                name = to_expand['name']
+                if name in return_dict and not (name in repo_dict and repo == repo_dict[name]):
+                    continue
+
+                return_dict[name] = Package(type_of=PossibleTypes.REPO_PACKAGE, **to_expand)
+
+        Package.check_packages_from_other_repos(return_dict, repo_dict)
+
         return list(return_dict.values())
 
-    def __init__(self, name: str, version: str, depends: Sequence[str] = None, conflicts: Sequence[str] = None,
-                 optdepends: Sequence[str] = None, provides: Sequence[str] = None, replaces: Sequence[str] = None,
+    @staticmethod
+    def get_packages_from_db(db_packages: Dict[str, Dict], packages_names: Sequence[str],
+                             packages_type: PossibleTypes) -> List['Package']:
+        """
+        Generates and returns packages read from the pacman database.
+        see: aurman.pacman_db
+
+        :param db_packages:     Dict containing the packages read from the pacman database.
+                                Names as keys, values of the packages as values
+        :param packages_names:  The names of the packages to generate
+        :param packages_type:   The type of the packages. PossibleTypes Enum value
+        :return:                List containing the packages
+        """
+        return_list = []
+
+        for name in packages_names:
+            to_expand = dict(db_packages[name])
+
+            if packages_type is PossibleTypes.AUR_PACKAGE or packages_type is PossibleTypes.DEVEL_PACKAGE:
+                if is_devel(name):
+                    to_expand['type_of'] = PossibleTypes.DEVEL_PACKAGE
+                else:
+                    to_expand['type_of'] = PossibleTypes.AUR_PACKAGE
+            else:
+                to_expand['type_of'] = packages_type
+
+            return_list.append(Package(**to_expand))
+
+        return return_list
+
+    def __init__(self, name: str, version: str, depends: Sequence[str] = None,
+                 conflicts: Union[str, Sequence[str]] = None, optdepends: Union[str, Sequence[str]] = None,
+                 provides: Union[str, Sequence[str]] = None, replaces: Union[str, Sequence[str]] = None,
                  pkgbase: str = None, install_reason: str = None, makedepends: Sequence[str] = None,
                  checkdepends: Sequence[str] = None, type_of: PossibleTypes = None, repo: str = None,
-                 groups: Sequence[str] = None):
-        self.name = name  # %n
-        self.version = version  # %v
-        self.depends = depends  # %D
+                 groups: Union[str, Sequence[str]] = None, last_modified: int = None):
+        self.name = intern_string(name)  # %n
+        self.version = intern_string(version)  # %v
+        self.depends = intern_strings(depends)  # %D
         self.conflicts = conflicts  # %H
         self.optdepends = optdepends  # %o
         self.provides = provides  # %P
         self.replaces = replaces  # %R
-        self.pkgbase = pkgbase  # %e
-        self.install_reason = install_reason  # %w (only with -Q)
-        self.makedepends = makedepends  # aur only
-        self.checkdepends = checkdepends  # aur only
+        self.pkgbase = intern_string(pkgbase)  # %e
+        self.install_reason = intern_string(install_reason)  # %w (only with -Q)
+        self.makedepends = intern_strings(makedepends)  # aur only
+        self.checkdepends = intern_strings(checkdepends)  # aur only
         self.type_of = type_of  # PossibleTypes Enum value
-        self.repo = repo  # %r (only useful for upstream repo packages)
+        self.repo = intern_string(repo)  # %r (only useful for upstream repo packages)
         self.groups = groups  # %G
+        self.last_modified = last_modified  # aur only, timestamp of the last change of the aur repo
 
     def __eq__(self, other):
         return isinstance(other, self.__class__) and self.name == other.name and self.version == other.version
@@ -426,7 +594,8 @@ class Package:
 
     def solutions_for_dep_problem(self, solution: 'DepAlgoSolution', found_problems: Set['DepAlgoFoundProblems'],
                                   installed_system: 'System', upstream_system: 'System',
-                                  deps_to_deep_check: Set[str]) -> List['DepAlgoSolution']:
+                                  deps_to_deep_check: Set[str],
+                                  deep_check_queries: Set[str] = None) -> List['DepAlgoSolution']:
         """
         Heart of this AUR helper. Algorithm for dependency solving.
         Also checks for conflicts, dep-cycles and topologically sorts the solutions.
@@ -436,6 +605,8 @@ class Package:
         :param installed_system:        The currently installed system
         :param upstream_system:         The system containing the known upstream packages
         :param deps_to_deep_check:      Set containing deps to check all possible dep providers of
+        :param deep_check_queries:      If given, the deps for which the content of deps_to_deep_check
+                                        made a difference are being added to this set
         :return:                        The found solutions
         """
 
@@ -549,8 +720,11 @@ class Package:
             # we only need relevant dep providers
             # deps_to_deep_check will be filled
             # when we encounter problems as dep-cycle, conflicts ...
-            if dep_stripped_name in dep_providers_names and dep not in deps_to_deep_check:
-                dep_providers = [package for package in dep_providers if package.name == dep_stripped_name]
+            if dep_stripped_name in dep_providers_names:
+                if deep_check_queries is not None:
+                    deep_check_queries.add(dep)
+                if dep not in deps_to_deep_check:
+                    dep_providers = [package for package in dep_providers if package.name == dep_stripped_name]
 
             # OR - at least one of the dep providers needs to provide the dep
             finished_solutions = [solution for solution in current_solutions if dep in solution.visited_names]
@@ -602,7 +776,8 @@ class Package:
                     found_problems.clear()
                     current_solutions.extend(
                         dep_provider.solutions_for_dep_problem(solution, found_problems, installed_system,
-                                                               upstream_system, deps_to_deep_check))
+                                                               upstream_system, deps_to_deep_check,
+                                                               deep_check_queries))
                     # save the new problems
                     new_problems.append(set(found_problems))
                     # remove added things
@@ -787,37 +962,56 @@ class Package:
         """
 
         deps_to_deep_check = set()
+        newly_deep_checked = set()
         single_first = False
 
-        while True:
-            current_solutions = [DepAlgoSolution([], [], set())]
-            found_problems = set()
+        # explored search state, so that growing deps_to_deep_check does not restart the whole search.
+        # explored_states[i] contains copies of the solutions and problems before step i,
+        # explored_queries[i] the deps for which deps_to_deep_check made a difference in step i.
+        # a step only depends on the state before it and on deps_to_deep_check,
+        # hence steps which did not query any of the newly deep checked deps yield the same result again.
+        # copying the solutions is expensive and most searches succeed in the first iteration,
+        # hence the steps are being recorded only after the first failed iteration.
+        record_steps = False
+        explored_states: List[Tuple[List['DepAlgoSolution'], Set['DepAlgoFoundProblems']]] = [
+            ([DepAlgoSolution([], [], set())], set())]
+        explored_queries: List[Set[str]] = []
 
+        while True:
             # calc solutions
-            # for every single package first
-            if single_first:
-                for package in packages:
-                    new_solutions = []
-                    for solution in current_solutions:
-                        solution.dict_call_as_needed = {package.name: True}
-                        new_solutions.extend(
-                            package.solutions_for_dep_problem(solution, found_problems, installed_system,
-                                                              upstream_system, deps_to_deep_check))
-                    current_solutions = new_solutions
-
+            # for every single package first, if single_first
             # now for all packages together
-            for solution in current_solutions:
-                solution.dict_call_as_needed = {}
-                for package in packages:
-                    solution.dict_call_as_needed[package.name] = True
-            for package in packages:
+            steps = [(package, True) for package in packages] if single_first else []
+            steps.extend([(package, False) for package in packages])
+
+            # find the first step being influenced by the newly deep checked deps
+            resume_index = 0
+            while resume_index < len(explored_queries) and not (explored_queries[resume_index] & newly_deep_checked):
+                resume_index += 1
+
+            del explored_states[resume_index + 1:]
+            del explored_queries[resume_index:]
+            current_solutions = [solution.solution_copy() for solution in explored_states[resume_index][0]]
+            found_problems = set(explored_states[resume_index][1])
+
+            for package, single in steps[resume_index:]:
+                queries = set()
                 new_solutions = []
                 for solution in current_solutions:
+                    if single:
+                        solution.dict_call_as_needed = {package.name: True}
+                    else:
+                        solution.dict_call_as_needed = {to_install.name: True for to_install in packages}
                     new_solutions.extend(
                         package.solutions_for_dep_problem(solution, found_problems, installed_system, upstream_system,
-                                                          deps_to_deep_check))
+                                                          deps_to_deep_check, queries))
                 current_solutions = new_solutions
 
+                if record_steps:
+                    explored_states.append(([solution.solution_copy() for solution in current_solutions],
+                                            set(found_problems)))
+                    explored_queries.append(queries)
+
             # delete invalid solutions
             current_solutions = [solution for solution in current_solutions if solution.is_valid]
 
@@ -825,17 +1019,22 @@ class Package:
             if current_solutions:
                 break
 
-            deps_to_deep_check_length = len(deps_to_deep_check)
+            record_steps = True
+            newly_deep_checked = set()
             for problem in found_problems:
-                problem_packages_names = set([package.name for package in problem.relevant_packages])
-                deps_to_deep_check |= problem_packages_names
+                newly_deep_checked |= set([package.name for package in problem.relevant_packages])
+            newly_deep_checked -= deps_to_deep_check
+            deps_to_deep_check |= newly_deep_checked
 
             # if there are no new deps to deep check, we are done, too
-            if len(deps_to_deep_check) == deps_to_deep_check_length and single_first:
+            if not newly_deep_checked and single_first:
                 break
-            elif len(deps_to_deep_check) == deps_to_deep_check_length:
+            elif not newly_deep_checked:
                 if len(packages) > 1:
                     single_first = True
+                    # the steps change, hence the explored state is not usable anymore
+                    del explored_states[1:]
+                    del explored_queries[:]
                 else:
                     break
 
@@ -847,17 +1046,72 @@ class Package:
 
         return [solution.packages_in_solution for solution in current_solutions]
 
-    def fetch_pkgbuild(self):
+    @staticmethod
+    def fetch_pkgbuilds(packages: Sequence['Package']):
+        """
+        Fetches the current git aur repo changes for packages concurrently.
+        Packages with the same pkgbase are being fetched once.
+
+        :param packages:    The packages to fetch
+        """
+        packages_to_fetch = {}
+        for package in packages:
+            if package.pkgbase not in packages_to_fetch:
+                packages_to_fetch[package.pkgbase] = package
+
+        if not packages_to_fetch:
+            return
+
+        failed = []
+        with ThreadPoolExecutor(max_workers=min(len(packages_to_fetch), Package.max_fetch_workers)) as executor:
+            futures = {executor.submit(package.fetch_pkgbuild, True): package
+                       for package in packages_to_fetch.values()}
+
+            for i, future in enumerate(as_completed(futures), start=1):
+                package = futures[future]
+                try:
+                    future.result()
+                except (InvalidInput, ConnectionProblem) as e:
+                    failed.append((package, e))
+                    continue
+
+                aurman_note("({}/{}) fetched {}".format(i, len(futures),
+                                                        Colors.BOLD(Colors.LIGHT_MAGENTA(package.pkgbase))))
+
+        if not failed:
+            return
+
+        for package, e in failed:
+            aurman_error("Fetching {} failed: {}".format(Colors.BOLD(Colors.LIGHT_MAGENTA(package.pkgbase)), e))
+
+        failed_names = ", ".join(package.pkgbase for package, e in failed)
+        if any(isinstance(e, ConnectionProblem) for package, e in failed):
+            raise ConnectionProblem("Fetching {} failed".format(failed_names))
+        raise InvalidInput("Fetching {} failed".format(failed_names))
+
+    def fetch_pkgbuild(self, quiet: bool = False):
         """
         Fetches the current git aur repo changes for this package
+
+        :param quiet:   If True, the output of git is not being shown
         """
         import aurman.aur_utilities
 
         package_dir = os.path.join(Package.cache_dir, self.pkgbase)
+        output = DEVNULL if quiet else None
 
         # check if repo has ever been fetched
         if os.path.isdir(package_dir):
-            if run("git fetch", shell=True, cwd=package_dir).returncode != 0:
+            # the aur repo did not change since the last fetch
+            if self.last_modified is not None \
+                    and self.read_fetch_state(package_dir) == (str(self.last_modified), git_head_commit(package_dir)):
+                return
+
+            # repos using the shared object store fetch from the store
+            if self.uses_shared_object_store(package_dir):
+                self.fetch_to_shared_object_store(output)
+
+            if run("git fetch", shell=True, stdout=output, stderr=output, cwd=package_dir).returncode != 0:
                 logging.error("git fetch of {} failed".format(self.name))
                 raise ConnectionProblem("git fetch of {} failed".format(self.name))
 
@@ -873,6 +1127,8 @@ class Package:
                     logging.error("sources of {} could not be fetched".format(self.name))
                     raise ConnectionProblem("sources of {} could not be fetched".format(self.name))
 
+            self.write_fetch_state(package_dir)
+
         # repo has never been fetched
         else:
             # create package dir
@@ -882,11 +1138,165 @@ class Package:
                 raise InvalidInput("Creating package dir of {} failed".format(self.name))
 
             # clone repo
-            if run("git clone {}/{}.git".format(aurman.aur_utilities.aur_domain, self.pkgbase), shell=True,
-                   cwd=Package.cache_dir).returncode != 0:
+            if Package.shared_object_store:
+                self.fetch_to_shared_object_store(output)
+                self.clone_from_shared_object_store(package_dir, output)
+            elif run("git clone {}/{}.git".format(aurman.aur_utilities.aur_domain, self.pkgbase), shell=True,
+                     stdout=output, stderr=output, cwd=Package.cache_dir).returncode != 0:
                 logging.error("Cloning repo of {} failed".format(self.name))
                 raise ConnectionProblem("Cloning repo of {} failed".format(self.name))
 
+            self.write_fetch_state(package_dir)
+
+    @staticmethod
+    def get_shared_object_store() -> str:
+        """
+        Returns the path of the shared object store, creates it if it does not exist.
+        The store is a bare repo containing the objects of all aur repos,
+        the refs of the aur repo of a pkgbase are stored below refs/aurman/pkgbase
+
+        :return:    The path of the shared object store
+        """
+        store_dir = os.path.join(Package.cache_dir, Package.shared_object_store_name)
+
+        with Package.shared_object_store_lock:
+            if not os.path.isdir(store_dir):
+                if run("git init --bare --quiet '{}'".format(store_dir), shell=True, stdout=DEVNULL,
+                       stderr=DEVNULL).returncode != 0:
+                    logging.error("Creating shared object store {} failed".format(store_dir))
+                    raise InvalidInput("Creating shared object store {} failed".format(store_dir))
+
+        return store_dir
+
+    @staticmethod
+    def uses_shared_object_store(package_dir: str) -> bool:
+        """
+        Checks if a repo borrows the objects of the shared object store,
+        see: https://git-scm.com/docs/gitrepository-layout#Documentation/gitrepository-layout.txt-objectsinfoalternates
+
+        :param package_dir:     The package dir of the repo
+        :return:                True if the repo uses the shared object store, False otherwise
+        """
+        alternates_file = os.path.join(package_dir, ".git", "objects", "info", "alternates")
+        store_objects_dir = os.path.join(Package.cache_dir, Package.shared_object_store_name, "objects")
+
+        try:
+            with open(alternates_file, "r") as f:
+                return store_objects_dir in f.read().splitlines()
+        except OSError:
+            return False
+
+    def fetch_to_shared_object_store(self, output: int = None):
+        """
+        Fetches the aur repo of this package into the shared object store
+
+        :param output:  Where to redirect the output of git to, None to show it
+        """
+        import aurman.aur_utilities
+
+        store_dir = Package.get_shared_object_store()
+
+        # fetches of different pkgbases may run concurrently, since they update the refs below their own namespace.
+        # no automatic gc, which could repack the store while other fetches are running
+        if run("git -c gc.auto=0 --git-dir='{}' fetch --no-tags {}/{}.git '+refs/heads/*:refs/aurman/{}/*'"
+               "".format(store_dir, aurman.aur_utilities.aur_domain, self.pkgbase, self.pkgbase), shell=True,
+               stdout=output, stderr=output).returncode != 0:
+            logging.error("Fetching repo of {} into the shared object store failed".format(self.name))
+            raise ConnectionProblem("Fetching repo of {} into the shared object store failed".format(self.name))
+
+    def clone_from_shared_object_store(self, package_dir: str, output: int = None):
+        """
+        Creates the repo of this package in the package dir from the shared object store.
+        The repo borrows the objects of the store and fetches from it, hence no objects are being copied.
+
+        :param package_dir:     The already existing package dir of this package
+        :param output:          Where to redirect the output of git to, None to show it
+        """
+        store_dir = Package.get_shared_object_store()
+
+        if run("git init --quiet && git remote add origin '{}' "
+               "&& git config remote.origin.fetch '+refs/aurman/{}/*:refs/remotes/origin/*'"
+               "".format(store_dir, self.pkgbase), shell=True, stdout=output, stderr=output,
+               cwd=package_dir).returncode != 0:
+            logging.error("Creating repo of {} failed".format(self.name))
+            raise InvalidInput("Creating repo of {} failed".format(self.name))
+
+        with open(os.path.join(package_dir, ".git", "objects", "info", "alternates"), "w") as f:
+            f.write("{}\n".format(os.path.join(store_dir, "objects")))
+
+        if run("git fetch --quiet && git checkout --quiet -b master --track origin/master", shell=True,
+               stdout=output, stderr=output, cwd=package_dir).returncode != 0:
+            logging.error("Cloning repo of {} from the shared object store failed".format(self.name))
+            raise InvalidInput("Cloning repo of {} from the shared object store failed".format(self.name))
+
+    @staticmethod
+    def prune_shared_object_store(pkgbases_to_keep: Set[str]):
+        """
+        Removes the objects of all other aur repos from the shared object store
+
+        :param pkgbases_to_keep:    The pkgbases of the aur repos to keep the objects of
+        """
+        store_dir = os.path.join(Package.cache_dir, Package.shared_object_store_name)
+        if not os.path.isdir(store_dir):
+            return
+
+        refs = run("git --git-dir='{}' for-each-ref --format='%(refname)' refs/aurman/".format(store_dir),
+                   shell=True, stdout=PIPE, stderr=DEVNULL, universal_newlines=True).stdout.strip().splitlines()
+        refs_to_delete = [ref for ref in refs if ref.split("/")[2] not in pkgbases_to_keep]
+        if not refs_to_delete:
+            return
+
+        with Package.shared_object_store_lock:
+            run("git --git-dir='{}' update-ref --stdin".format(store_dir), shell=True, stdout=DEVNULL,
+                stderr=DEVNULL, input="".join("delete {}\n".format(ref) for ref in refs_to_delete),
+                universal_newlines=True)
+            run("git --git-dir='{}' gc --prune=now --quiet".format(store_dir), shell=True, stdout=DEVNULL,
+                stderr=DEVNULL)
+
+    @staticmethod
+    def fetch_state_file(package_dir: str) -> str:
+        """
+        Returns the path of the file containing the last seen LastModified of the aur
+        and the HEAD of the aur repo after the last fetch
+
+        :param package_dir:     The package dir of the package
+        :return:                The path of the file
+        """
+        return os.path.join(package_dir, ".git", "aurman", "last_modified")
+
+    def read_fetch_state(self, package_dir: str) -> Union[Tuple[str, str], None]:
+        """
+        Reads the state of the last fetch, see: fetch_state_file
+
+        :param package_dir:     The package dir of the package
+        :return:                Tuple containing LastModified and the HEAD, None if not available
+        """
+        try:
+            with open(Package.fetch_state_file(package_dir), "r") as f:
+                last_modified, head = f.read().split()
+        except (OSError, ValueError):
+            return None
+
+        return last_modified, head
+
+    def write_fetch_state(self, package_dir: str):
+        """
+        Writes the state after a fetch, see: fetch_state_file
+
+        :param package_dir:     The package dir of the package
+        """
+        head = git_head_commit(package_dir)
+        if self.last_modified is None or head is None:
+            return
+
+        fetch_state_file = Package.fetch_state_file(package_dir)
+        try:
+            os.makedirs(os.path.dirname(fetch_state_file), exist_ok=True)
+            with open(fetch_state_file, "w") as f:
+                f.write("{}\n{}\n".format(self.last_modified, head))
+        except OSError:
+            logging.debug("writing {} failed".format(fetch_state_file), exc_info=True)
+
     def search_and_fetch_pgp_keys(self, fetch_always: bool = False, keyserver: str = None):
         """
         Searches for not imported pgp keys of this package and fetches them
@@ -1039,12 +1449,12 @@ class Package:
             logging.error("Files of {} are not okay".format(self.name))
             raise InvalidInput("Files of {} are not okay".format(self.name))
 
-    def version_from_srcinfo(self) -> str:
-        """
-        Returns the version from the srcinfo
-        :return:    The version read from the srcinfo
+    def srcinfo_key(self) -> Tuple[str, Union[str, None], Union[int, None]]:
         """
+        Returns the key of the current srcinfo of this package, see: srcinfo_versions
 
+        :return:    pkgbase, commit hash of HEAD, None if unknown, and mtime of the PKGBUILD
+        """
         if self.pkgbase is None:
             logging.error("base package name of {} not known".format(self.name))
             raise InvalidInput("base package name of {} not known".format(self.name))
@@ -1054,17 +1464,64 @@ class Package:
             logging.error("package dir of {} does not exist".format(self.name))
             raise InvalidInput("package dir of {} does not exist".format(self.name))
 
-        src_lines = makepkg("--printsrcinfo", True, package_dir)
-        pkgver = None
-        pkgrel = None
-        epoch = None
-        for line in src_lines:
-            if "pkgver =" in line:
-                pkgver = line.split("=")[1].strip()
-            elif "pkgrel =" in line:
-                pkgrel = line.split("=")[1].strip()
-            elif "epoch =" in line:
-                epoch = line.split("=")[1].strip()
+        # the version only changes with the commit or with changes of the PKGBUILD, e.g. by pkgver()
+        commit_hash = git_head_commit(package_dir)
+        pkgbuild = os.path.join(package_dir, "PKGBUILD")
+        pkgbuild_mtime = os.stat(pkgbuild).st_mtime_ns if os.path.isfile(pkgbuild) else None
+        return self.pkgbase, commit_hash, pkgbuild_mtime
+
+    def srcinfo_lines(self) -> List[str]:
+        """
+        Returns the lines of the current srcinfo of this package.
+        The committed .SRCINFO is used as long as PKGBUILD and .SRCINFO are unchanged since HEAD,
+        otherwise makepkg --printsrcinfo
+
+        :return:    The lines of the srcinfo
+        """
+        package_dir = os.path.join(Package.cache_dir, self.pkgbase)
+        srcinfo = os.path.join(package_dir, ".SRCINFO")
+        if git_head_commit(package_dir) is not None and os.path.isfile(srcinfo) \
+                and run("git diff --quiet HEAD -- PKGBUILD .SRCINFO", shell=True, stdout=DEVNULL, stderr=DEVNULL,
+                        cwd=package_dir).returncode == 0:
+            with open(srcinfo, "r") as f:
+                return f.read().strip().splitlines()
+
+        return makepkg("--printsrcinfo", True, package_dir)
+
+    def pkgnames_from_srcinfo(self) -> List[str]:
+        """
+        Returns the names of the packages built from the pkgbase of this package, e.g. split packages
+
+        :return:    The names read from the srcinfo
+        """
+        srcinfo_key = self.srcinfo_key()
+        if srcinfo_key[1] is not None and srcinfo_key in Package.srcinfo_pkgnames:
+            return Package.srcinfo_pkgnames[srcinfo_key]
+
+        pkgnames = []
+        for line in self.srcinfo_lines():
+            key, separator, value = line.strip().partition(" = ")
+            if separator and key == "pkgname":
+                pkgnames.append(value)
+
+        if srcinfo_key[1] is not None:
+            Package.srcinfo_pkgnames[srcinfo_key] = pkgnames
+
+        return pkgnames
+
+    def version_from_srcinfo(self) -> str:
+        """
+        Returns the version from the srcinfo
+        :return:    The version read from the srcinfo
+        """
+        versions_key = self.srcinfo_key()
+        if versions_key[1] is not None and versions_key in Package.srcinfo_versions:
+            return Package.srcinfo_versions[versions_key]
+
+        srcinfo_fields = parse_srcinfo(self.srcinfo_lines())
+        pkgver = srcinfo_fields.get("pkgver", [None])[0]
+        pkgrel = srcinfo_fields.get("pkgrel", [None])[0]
+        epoch = srcinfo_fields.get("epoch", [None])[0]
 
         version = ""
         if epoch is not None:
@@ -1077,6 +1534,9 @@ class Package:
         if pkgrel is not None:
             version += "-" + pkgrel
 
+        if versions_key[1] is not None:
+            Package.srcinfo_versions[versions_key] = version
+
         return version
 
     def get_devel_version(self):
@@ -1090,6 +1550,19 @@ class Package:
 
         self.version = self.version_from_srcinfo()
 
+    def prefetch_sources(self):
+        """
+        Downloads and verifies the sources of this package without building it,
+        hence the build may start compiling immediately.
+        The output of makepkg is written to a log file in the package dir.
+        Failures are not fatal, the sources are being fetched again when building.
+        """
+        package_dir = os.path.join(Package.cache_dir, self.pkgbase)
+        try:
+            makepkg("--verifysource", False, package_dir, os.path.join(package_dir, "aurman_prefetch.log"))
+        except InvalidInput:
+            logging.info("prefetching the sources of {} failed".format(self.name))
+
     @staticmethod
     def get_build_dir(package_dir):
         """
@@ -1098,21 +1571,12 @@ class Package:
         :param package_dir:     The package dir of the package
         :return:                The build dir in case there is one, the package dir otherwise
         """
-        makepkg_conf = os.path.join("/etc", "makepkg.conf")
-        if not os.path.isfile(makepkg_conf):
-            logging.error("makepkg.conf not found")
-            raise InvalidInput("makepkg.conf not found")
-
-        with open(makepkg_conf, "r") as f:
-            makepkg_conf_lines = f.read().strip().splitlines()
-
-        for line in makepkg_conf_lines:
-            line_stripped = line.strip()
-            if line_stripped.startswith("PKGDEST="):
-                return os.path.expandvars(os.path.expanduser(line_stripped.split("PKGDEST=")[1].strip()))
-        else:
+        pkgdest = read_makepkg_conf().variables['PKGDEST']
+        if pkgdest is None:
             return package_dir
 
+        return os.path.expanduser(pkgdest)
+
     def get_package_file_to_install(self, build_dir: str, build_version: str) -> Union[str, None]:
         """
         Gets the .pkg. file of the package to install
@@ -1121,21 +1585,18 @@ class Package:
         :param build_version:   Build version to look for
         :return:                The name of the package file to install, None if there is none
         """
-        files_in_build_dir = [f for f in os.listdir(build_dir) if os.path.isfile(os.path.join(build_dir, f))]
-        for file in files_in_build_dir:
-            if file.startswith(self.name + "-" + build_version + "-") and ".pkg." in \
-                    file.split(self.name + "-" + build_version + "-")[1]:
-                return file
-        else:
-            return None
+        return ArtifactIndex.of_dir(build_dir).find(self.name, build_version,
+                                                    pkgext=read_makepkg_conf().variables['PKGEXT'])
 
-    def build(self, ignore_arch: bool = False, rebuild: bool = False):
+    def build(self, ignore_arch: bool = False, rebuild: bool = False, log_file: str = None, jobs: int = None):
         """
         Build this package
 
         :param ignore_arch: If True, pass -A to makepkg, thus allows building packages for architectures,
                             not mentioned in the PKGBUILD
         :param rebuild:     If True, always rebuild package
+        :param log_file:    If given, the output of makepkg is written to this file instead of being shown
+        :param jobs:        If given, the number of make jobs replacing the one of the configured MAKEFLAGS
         """
         # check if build needed
         build_version = self.version_from_srcinfo()
@@ -1143,10 +1604,70 @@ class Package:
         build_dir = Package.get_build_dir(package_dir)
 
         if rebuild or (self.get_package_file_to_install(build_dir, build_version) is None):
-            if not ignore_arch:
-                makepkg("-cf --noconfirm", False, package_dir)
+            binary_cache_key = None
+            if Package.binary_cache is not None:
+                binary_cache_key = (self.pkgbase, build_version,
+                                    read_makepkg_conf().variables['CARCH'] or os.uname().machine,
+                                    BinaryCache.tree_hash(package_dir))
+                cached_files = [] if rebuild else Package.binary_cache.fetch(binary_cache_key, self.name, build_dir)
+                if cached_files:
+                    aurman_note("using {} from the binary cache".format(Colors.BOLD(Colors.LIGHT_MAGENTA(self.name))))
+                    self.add_to_local_repo(build_dir, cached_files)
+                    return
+
+            build_start = time.time()
+            options = "-cf --noconfirm" if not ignore_arch else "-cfA --noconfirm"
+            if jobs is None:
+                makepkg(options, False, package_dir, log_file)
             else:
-                makepkg("-cfA --noconfirm", False, package_dir)
+                makepkg_conf = write_makepkg_conf(
+                    {'MAKEFLAGS': replace_jobs_in_makeflags(read_makepkg_conf().variables['MAKEFLAGS'], jobs)})
+                try:
+                    makepkg("{} --config '{}'".format(options, makepkg_conf), False, package_dir, log_file)
+                finally:
+                    os.remove(makepkg_conf)
+
+            # pkgver() of devel packages may have changed the version during the build
+            built_version = self.version_from_srcinfo()
+            # other pkgbases may be built into the same PKGDEST at the same time
+            built_files = package_files_since(build_dir, self.pkgnames_from_srcinfo(), built_version, build_start)
+            if binary_cache_key is not None:
+                Package.binary_cache.publish(binary_cache_key[:1] + (built_version,) + binary_cache_key[2:],
+                                             build_dir, built_files)
+            self.add_to_local_repo(build_dir, built_files)
+
+    def add_to_local_repo(self, build_dir: str, file_names: Sequence[str]):
+        """
+        Adds built package files of the pkgbase of this package to the local repository, if configured.
+        The files are copied next to the repository database, signatures are not required.
+
+        :param build_dir:   The dir containing the package files
+        :param file_names:  The names of the package files and their signatures
+        """
+        if Package.local_repo is None or not file_names:
+            return
+
+        # only files of this pkgbase, e.g. binary cache entries published by older versions may contain others
+        pkgnames = self.pkgnames_from_srcinfo()
+        file_names = [file_name for file_name in file_names
+                      if (parse_package_file_name(file_name[:-len(".sig")] if file_name.endswith(".sig")
+                                                  else file_name) or ("",))[0] in pkgnames]
+        if not file_names:
+            return
+
+        repo_dir = os.path.dirname(os.path.abspath(Package.local_repo))
+        try:
+            os.makedirs(repo_dir, exist_ok=True)
+        except OSError:
+            logging.error("creating the local repository dir {} failed".format(repo_dir))
+            raise InvalidInput("creating the local repository dir {} failed".format(repo_dir))
+        if os.path.abspath(build_dir) != repo_dir:
+            for file_name in file_names:
+                copy_file_atomically(os.path.join(build_dir, file_name), os.path.join(repo_dir, file_name))
+
+        with Package.local_repo_lock:
+            repo_add("-R", Package.local_repo, [os.path.join(repo_dir, file_name) for file_name in file_names
+                                                if not file_name.endswith(".sig")])
 
     def install(self, args_as_string: str, use_ask: bool = False):
         """
@@ -1155,42 +1676,237 @@ class Package:
         :param args_as_string:  Args for pacman
         :param use_ask:         Use --ask=4 when calling pacman, see: https://git.archlinux.org/pacman.git/commit/?id=90e3e026d1236ad89c142b427d7eeb842bbb7ff4
         """
-        build_dir = Package.get_build_dir(os.path.join(Package.cache_dir, self.pkgbase))
+        Package.install_packages([self], args_as_string, use_ask)
 
-        # get name of package install file
-        build_version = self.version_from_srcinfo()
-        package_install_file = self.get_package_file_to_install(build_dir, build_version)
+    @staticmethod
+    def install_packages(packages: Sequence['Package'], args_as_string: str, use_ask: bool = False):
+        """
+        Install built packages in one pacman transaction
+
+        :param packages:        The packages to install
+        :param args_as_string:  Args for pacman
+        :param use_ask:         Use --ask=4 when calling pacman, see: https://git.archlinux.org/pacman.git/commit/?id=90e3e026d1236ad89c142b427d7eeb842bbb7ff4
+        """
+        package_install_files = []
+        # the build dirs and the build versions of the pkgbases, split packages share them
+        builds_of_pkgbases: Dict[str, Tuple[str, str]] = {}
+        for package in packages:
+            if package.pkgbase not in builds_of_pkgbases:
+                builds_of_pkgbases[package.pkgbase] = (
+                    Package.get_build_dir(os.path.join(Package.cache_dir, package.pkgbase)),
+                    package.version_from_srcinfo())
+            build_dir, build_version = builds_of_pkgbases[package.pkgbase]
+
+            # get name of package install file
+            package_install_file = package.get_package_file_to_install(build_dir, build_version)
 
-        if package_install_file is None:
-            logging.error("package file of {} not available".format(self.name))
-            raise InvalidInput("package file of {} not available".format(self.name))
+            if package_install_file is None:
+                logging.error("package file of {} not available".format(package.name))
+                raise InvalidInput("package file of {} not available".format(package.name))
+
+            package_install_files.append(os.path.join(build_dir, package_install_file))
 
         if use_ask:
             args_as_string += " --ask=4"
 
         # install
-        pacman("{} {}".format(args_as_string, package_install_file), False, dir_to_execute=build_dir)
+        pacman("{} {}".format(args_as_string, " ".join("'{}'".format(package_install_file)
+                                                       for package_install_file in package_install_files)), False)
 
 
 class System:
     """
     Class representing a "system", which is a collection of Arch Linux packages.
     """
+    # the system being shared with forked worker processes, see: hypothetical_append_solutions_to_system
+    forked_system: 'System' = None
+    # increase in case of changes of the snapshot layout, see: save_snapshot
+    snapshot_version: int = 2
+
+    @staticmethod
+    def snapshot_key(installed: bool) -> Tuple:
+        """
+        Returns the key of the snapshot of the installed or the upstream repo system.
+        The key changes if the databases, the pacman.conf or the aurman config change.
+
+        :param installed:   True for the installed system, False for the upstream repo system
+        :return:            The key as tuple
+        """
+        config = AurmanConfig.aurman_config
+        config_state = tuple((section, tuple(config[section].items())) for section in config.sections())
+        pacman_conf_stat = os.stat(os.path.join("/etc", "pacman.conf"))
+
+        key = (System.snapshot_version, config_state, pacman_conf_stat.st_mtime_ns, pacman_conf_stat.st_size,
+               tuple(sync_dbs_state()))
+        if installed:
+            key += local_db_state()
+
+        return key
+
+    @staticmethod
+    def snapshot_path(installed: bool) -> str:
+        """
+        Returns the path of the snapshot of the installed or the upstream repo system.
+        The snapshots are files, hence they are not affected by cleaning the cache of package dirs.
+
+        :param installed:   True for the installed system, False for the upstream repo system
+        :return:            The path
+        """
+        if installed:
+            return os.path.join(Package.cache_dir, ".installed_system.snapshot")
+        return os.path.join(Package.cache_dir, ".repo_system.snapshot")
+
+    @staticmethod
+    def load_snapshot(path: str, key: Tuple) -> Union['System', None]:
+        """
+        Loads a system from a snapshot.
+        The snapshot is being memory mapped, packages are being materialized on first access.
+
+        :param path:    The path of the snapshot
+        :param key:     The key the snapshot must have been saved with
+        :return:        The loaded system, None if there is no valid snapshot
+        """
+        try:
+            index = PackageIndex(path)
+        except (OSError, EOFError, ValueError, TypeError, struct_error):
+            logging.debug("snapshot {} not usable".format(path), exc_info=True)
+            return None
+
+        if index.key != key:
+            return None
+
+        return MappedSystem(index)
+
+    def save_snapshot(self, path: str, key: Tuple):
+        """
+        Saves this system as snapshot, see: aurman.package_index
+
+        :param path:    The path of the snapshot
+        :param key:     The key to save the snapshot with
+        """
+        packages = list(self.all_packages_dict.values())
+        indices = {package.name: i for i, package in enumerate(packages)}
+        records = []
+        for package in packages:
+            record = {field: getattr(package, field) for field in string_fields + list_fields}
+            record['type_of'] = package.type_of.name
+            records.append(record)
+
+        provides_index = {name: [indices[package.name] for package in providers]
+                          for name, providers in self.provides_dict.items()}
+        conflicts_index = {name: [indices[package.name] for package in conflicting]
+                           for name, conflicting in self.conflicts_dict.items()}
+
+        try:
+            os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+            write_package_index(path, key, records, provides_index, conflicts_index)
+        except (OSError, ValueError, struct_error):
+            logging.debug("saving snapshot {} failed".format(path), exc_info=True)
+
+    @staticmethod
+    def get_snapshot_system(installed: bool) -> 'System':
+        """
+        Returns the installed or the upstream repo system.
+        Uses the snapshot of the last run, if nothing relevant changed since then.
+
+        :param installed:   True for the installed system, False for the upstream repo system
+        :return:            The system
+        """
+        path = System.snapshot_path(installed)
+        try:
+            key = System.snapshot_key(installed)
+        except OSError:
+            logging.debug("snapshot key not available", exc_info=True)
+            key = None
+
+        installed_aur_packages_names = None
+        if key is not None:
+            system = System.load_snapshot(path, key)
+            if system is not None and not installed:
+                return system
+
+            # the aur changes independently of the key, hence the installed aur packages are being queried anyway
+            if system is not None:
+                unclassified_installed_names = set(package.name for package in system.aur_packages_list
+                                                   + system.devel_packages_list
+                                                   + system.not_repo_not_aur_packages_list)
+                installed_aur_packages_names = System.get_installed_aur_packages_names(unclassified_installed_names)
+                if installed_aur_packages_names == set(package.name for package in system.aur_packages_list
+                                                       + system.devel_packages_list):
+                    return system
+
+        if installed:
+            system = System(System.get_installed_packages(installed_aur_packages_names))
+        else:
+            system = System(System.get_repo_packages())
+
+        if key is not None:
+            system.save_snapshot(path, key)
+
+        return system
+
+    @staticmethod
+    def get_installed_system() -> 'System':
+        """
+        Returns the system containing the installed packages
+
+        :return:    The installed system
+        """
+        return System.get_snapshot_system(True)
 
     @staticmethod
-    def get_installed_packages() -> List['Package']:
+    def get_repo_system() -> 'System':
+        """
+        Returns the system containing the current repo packages
+
+        :return:    The upstream repo system
+        """
+        return System.get_snapshot_system(False)
+
+    @staticmethod
+    def get_installed_aur_packages_names(unclassified_installed_names: Set[str]) -> Set[str]:
+        """
+        Queries which of the installed packages, which are not in the known repos, are in the aur.
+        The packages the user wants to install from the aur must be in the aur.
+
+        :param unclassified_installed_names:    The names of the installed packages not in the known repos
+        :return:                                The names of the installed aur packages
+        """
+        installed_aur_packages_names = set(
+            [package.name for package in Package.get_packages_from_aur(list(unclassified_installed_names))])
+
+        # package names the user gave us must be in the aur
+        for name in packages_from_other_sources()[0]:
+            if name not in installed_aur_packages_names:
+                aurman_error("Package {} not found in AUR!".format(Colors.BOLD(Colors.LIGHT_MAGENTA(name))))
+                raise InvalidInput("Package {} not found in AUR!".format(Colors.BOLD(Colors.LIGHT_MAGENTA(name))))
+
+        return installed_aur_packages_names
+
+    @staticmethod
+    def get_installed_packages(installed_aur_packages_names: Set[str] = None) -> List['Package']:
         """
         Returns the installed packages on the system
 
-        :return:    A list containing the installed packages
+        :param installed_aur_packages_names:    The names of the installed aur packages, if already queried,
+                                                see: get_installed_aur_packages_names
+        :return:                                A list containing the installed packages
         """
-        repo_packages_names = set(expac("-S", ('n',), ()))
+        try:
+            repo_packages_names = set([package['name'] for packages in
+                                       read_sync_dbs(tuple(Package.get_known_repos())).values()
+                                       for package in packages])
+        except InvalidInput:
+            logging.info("falling back to expac for reading the sync databases")
+            repo_packages_names = set(expac("-S", ('n',), ()))
 
         # packages the user wants to install from aur
         aur_names = packages_from_other_sources()[0]
         repo_packages_names -= aur_names
 
-        installed_packages_names = set(expac("-Q", ('n',), ()))
+        # read the local pacman database at once, no need for expac -Q
+        local_packages = read_local_db(max_workers=min(8, os.cpu_count() or 1))
+        installed_packages_names = set(local_packages)
         installed_repo_packages_names = installed_packages_names & repo_packages_names
         unclassified_installed_names = installed_packages_names - installed_repo_packages_names
 
@@ -1199,28 +1915,24 @@ class System:
         # installed repo packages
         if installed_repo_packages_names:
             return_list.extend(
-                Package.get_packages_from_expac("-Q", list(installed_repo_packages_names), PossibleTypes.REPO_PACKAGE))
+                Package.get_packages_from_db(local_packages, installed_repo_packages_names, PossibleTypes.REPO_PACKAGE))
 
         # installed aur packages
-        installed_aur_packages_names = set(
-            [package.name for package in Package.get_packages_from_aur(list(unclassified_installed_names))])
-
-        # package names the user gave us must be in the aur
-        for name in aur_names:
-            if name not in installed_aur_packages_names:
-                aurman_error("Package {} not found in AUR!".format(Colors.BOLD(Colors.LIGHT_MAGENTA(name))))
-                raise InvalidInput("Package {} not found in AUR!".format(Colors.BOLD(Colors.LIGHT_MAGENTA(name))))
+        if installed_aur_packages_names is None:
+            installed_aur_packages_names = System.get_installed_aur_packages_names(unclassified_installed_names)
+        else:
+            installed_aur_packages_names &= unclassified_installed_names
 
         if installed_aur_packages_names:
             return_list.extend(
-                Package.get_packages_from_expac("-Q", list(installed_aur_packages_names), PossibleTypes.AUR_PACKAGE))
+                Package.get_packages_from_db(local_packages, installed_aur_packages_names, PossibleTypes.AUR_PACKAGE))
 
         unclassified_installed_names -= installed_aur_packages_names
 
         # installed not repo not aur packages
         if unclassified_installed_names:
-            return_list.extend(Package.get_packages_from_expac("-Q", list(unclassified_installed_names),
-                                                               PossibleTypes.PACKAGE_NOT_REPO_NOT_AUR))
+            return_list.extend(Package.get_packages_from_db(local_packages, unclassified_installed_names,
+                                                            PossibleTypes.PACKAGE_NOT_REPO_NOT_AUR))
 
         return return_list
 
@@ -1231,7 +1943,7 @@ class System:
 
         :return:    A list containing the current repo packages
         """
-        return Package.get_packages_from_expac("-S", (), PossibleTypes.REPO_PACKAGE)
+        return Package.get_packages_from_sync_dbs()
 
     def __init__(self, packages: Sequence['Package']):
         self.all_packages_dict = {}  # names as keys and packages as values
@@ -1241,12 +1953,35 @@ class System:
         self.not_repo_not_aur_packages_list = []  # list containing the packages that are neither repo nor aur packages
 
         # reverse dict for finding providings. names of providings as keys and providing packages as values in lists
-        self.provides_dict = {}
+        # built on first access, see provides_dict
+        self._provides_dict = None
         # same for conflicts
-        self.conflicts_dict = {}
+        self._conflicts_dict = None
 
         self.append_packages(packages)
 
+    @property
+    def provides_dict(self) -> Dict[str, List['Package']]:
+        if self._provides_dict is None:
+            self._provides_dict = {}
+            self.__append_to_x_dict(self.all_packages_dict.values(), 'provides')
+        return self._provides_dict
+
+    @provides_dict.setter
+    def provides_dict(self, provides_dict: Dict[str, List['Package']]):
+        self._provides_dict = provides_dict
+
+    @property
+    def conflicts_dict(self) -> Dict[str, List['Package']]:
+        if self._conflicts_dict is None:
+            self._conflicts_dict = {}
+            self.__append_to_x_dict(self.all_packages_dict.values(), 'conflicts')
+        return self._conflicts_dict
+
+    @conflicts_dict.setter
+    def conflicts_dict(self, conflicts_dict: Dict[str, List['Package']]):
+        self._conflicts_dict = conflicts_dict
+
     def recreate_dicts(self):
         self.__init__(list(self.all_packages_dict.values()))
 
@@ -1276,8 +2011,11 @@ class System:
         self.__append_to_x_dict(packages, 'provides')
         self.__append_to_x_dict(packages, 'conflicts')
 
-    def __append_to_x_dict(self, packages: Sequence['Package'], dict_name: str):
-        dict_to_append_to = getattr(self, "{}_dict".format(dict_name))
+    def __append_to_x_dict(self, packages: Iterable['Package'], dict_name: str):
+        dict_to_append_to = getattr(self, "_{}_dict".format(dict_name))
+        # not built yet, the packages are going to be added on first access
+        if dict_to_append_to is None:
+            return
 
         for package in packages:
             relevant_package_values = getattr(package, dict_name)
@@ -1471,6 +2209,83 @@ class System:
 
         return return_list
 
+    def reorder_for_install_chunks(self, packages: Sequence['Package']) -> List['Package']:
+        """
+        Reorders packages to install (only makes sense for the installed system),
+        such that the repo packages are installed in as few chunks as possible.
+        see: calc_install_chunks
+
+        Packages are only moved as far as the deps allow, versioning is ignored.
+        Packages which conflict with other packages than the ones they upgrade keep their order
+        relative to the aur packages.
+        If appending the reordered packages yields another system than appending the packages in the given order,
+        the given order is returned.
+
+        :param packages:    The packages in the order of the solution
+        :return:            The reordered packages
+        """
+        packages_system = System(packages)
+
+        # indices of the packages as keys and the indices of the packages to install before as values
+        install_after: Dict[int, Set[int]] = {i: set() for i in range(0, len(packages))}
+        indices = {package.name: i for i, package in enumerate(packages)}
+        for i, package in enumerate(packages):
+            for dep in package.relevant_deps():
+                dep_name = strip_versioning_from_name(dep)
+                providers = list(packages_system.provides_dict.get(dep_name, ()))
+                if dep_name in packages_system.all_packages_dict:
+                    providers.append(packages_system.all_packages_dict[dep_name])
+                install_after[i].update(indices[provider.name] for provider in providers
+                                        if indices[provider.name] < i)
+
+        aur_indices = [i for i, package in enumerate(packages) if package.type_of is not PossibleTypes.REPO_PACKAGE]
+        for i, package in enumerate(packages):
+            if package.type_of is not PossibleTypes.REPO_PACKAGE:
+                continue
+            conflicting_packages = self.conflicting_with(package) + packages_system.conflicting_with(package)
+            if not [conflicting for conflicting in conflicting_packages if conflicting.name != package.name]:
+                continue
+            for aur_index in aur_indices:
+                if aur_index < i:
+                    install_after[i].add(aur_index)
+                else:
+                    install_after[aur_index].add(i)
+
+        reordered: List['Package'] = []
+        installed: Set[int] = set()
+        remaining = list(range(0, len(packages)))
+
+        def install_ready(only_repo: bool) -> bool:
+            for i in remaining:
+                if only_repo and packages[i].type_of is not PossibleTypes.REPO_PACKAGE:
+                    continue
+                if install_after[i] <= installed:
+                    reordered.append(packages[i])
+                    installed.add(i)
+                    remaining.remove(i)
+                    return True
+
+            return False
+
+        # all ready repo packages are installed before the next aur package
+        while remaining:
+            while install_ready(True):
+                pass
+            if not install_ready(False):
+                break
+
+        if remaining:
+            return list(packages)
+
+        if reordered != list(packages):
+            reordered_system = self.hypothetical_append_packages_to_system(reordered)
+            packages_system = self.hypothetical_append_packages_to_system(list(packages))
+            if {(package.name, package.version) for package in reordered_system.all_packages_dict.values()} \
+                    != {(package.name, package.version) for package in packages_system.all_packages_dict.values()}:
+                return list(packages)
+
+        return reordered
+
     def sanitize_user_input(self, user_input: Sequence[str]) -> Set[str]:
         """
         Finds the names of the packages for the user_input
@@ -1754,6 +2569,38 @@ class System:
 
         return first_return_tuple, return_list
 
+    def hypothetical_append_solutions_to_system(self, solutions: List[List['Package']]) -> List['System']:
+        """
+        Calls hypothetical_append_packages_to_system for every solution.
+        The solutions are independent of each other, hence in case of more than one solution
+        the work is being distributed over forked processes, which share this system copy-on-write.
+        The processes only return the names of the removed and the added packages,
+        the resulting systems are being rebuilt from those.
+        Forking is avoided if other threads are running, since their locks would be copied in any state.
+
+        :param solutions:   The solutions to append
+        :return:            The resulting systems, in the same order as the solutions
+        """
+        if len(solutions) < 2 or "fork" not in multiprocessing.get_all_start_methods() \
+                or threading.active_count() > 1:
+            return [self.hypothetical_append_packages_to_system(solution) for solution in solutions]
+
+        System.forked_system = self
+        try:
+            with multiprocessing.get_context("fork").Pool(min(len(solutions), os.cpu_count() or 1)) as pool:
+                differences = pool.map(_hypothetical_append_to_forked_system, solutions)
+        finally:
+            System.forked_system = None
+
+        new_systems = []
+        for solution, (removed_names, added_names) in zip(solutions, differences):
+            solution_packages = {package.name: package for package in solution}
+            new_systems.append(System([package for package in self.all_packages_dict.values()
+                                       if package.name not in removed_names]
+                                      + [solution_packages[name] for name in added_names]))
+
+        return new_systems
+
     def validate_solutions(self, solutions: List[List['Package']], needed_packages: Sequence['Package']) -> List[
         Tuple['System', List['Package']]]:
         """
@@ -1769,7 +2616,7 @@ class System:
         """
 
         # calculate new systems
-        new_systems = [self.hypothetical_append_packages_to_system(solution) for solution in solutions]
+        new_systems = self.hypothetical_append_solutions_to_system(solutions)
         valid_systems_tuples = []
         # find valid systems
         for i, new_system in enumerate(new_systems):
@@ -1980,3 +2827,178 @@ class System:
 
         if not noconfirm and not ask_user(user_question, True, True):
             raise InvalidInput()
+
+
+class MappedPackages(MutableMapping):
+    """
+    Dict like container of packages with names as keys, serving the packages of a PackageIndex.
+    Packages are being materialized on first access, changes are kept in memory.
+    """
+
+    def __init__(self, index: PackageIndex):
+        self.index: PackageIndex = index
+        self.materialized: Dict[int, 'Package'] = {}  # record ids as keys, materialized packages as values
+        self.added: Dict[str, 'Package'] = {}  # packages set after loading
+        self.deleted: Set[str] = set()  # names of deleted packages of the index
+
+    def package(self, record_id: int) -> 'Package':
+        """
+        Materializes a package of the index
+
+        :param record_id:   The record id of the package
+        :return:            The package
+        """
+        if record_id not in self.materialized:
+            to_expand = self.index.record(record_id)
+            to_expand['type_of'] = PossibleTypes[to_expand['type_of']]
+            self.materialized[record_id] = Package(**to_expand)
+        return self.materialized[record_id]
+
+    def __getitem__(self, name: str) -> 'Package':
+        if name in self.added:
+            return self.added[name]
+        if name in self.deleted:
+            raise KeyError(name)
+        record_id = self.index.find(name)
+        if record_id == -1:
+            raise KeyError(name)
+        return self.package(record_id)
+
+    def __contains__(self, name) -> bool:
+        if name in self.added:
+            return True
+        return name not in self.deleted and self.index.find(name) != -1
+
+    def __setitem__(self, name: str, package: 'Package'):
+        self.added[name] = package
+
+    def __delitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        self.added.pop(name, None)
+        if self.index.find(name) != -1:
+            self.deleted.add(name)
+
+    def __iter__(self):
+        for record_id in range(len(self.index)):
+            name = self.index.name(record_id)
+            if name not in self.deleted and name not in self.added:
+                yield name
+        yield from list(self.added)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class MappedReverseDict(MutableMapping):
+    """
+    Dict like container for the provides_dict and conflicts_dict of a MappedSystem.
+    The lists of packages are being materialized on first access and may be changed afterwards.
+    """
+
+    def __init__(self, packages: MappedPackages, lookup, names):
+        """
+        :param packages:    The packages of the system
+        :param lookup:      Function returning the record ids for a name, e.g. PackageIndex.providing
+        :param names:       Function returning the names known by the index, e.g. PackageIndex.provided_names
+        """
+        self.packages: MappedPackages = packages
+        self.lookup = lookup
+        self.names = names
+        self.lists: Dict[str, List['Package']] = {}
+        self.deleted: Set[str] = set()  # names of deleted entries of the index
+
+    def __getitem__(self, name: str) -> List['Package']:
+        if name not in self.lists:
+            if name in self.deleted:
+                raise KeyError(name)
+            record_ids = self.lookup(name)
+            if not record_ids:
+                raise KeyError(name)
+            self.lists[name] = [self.packages.package(record_id) for record_id in record_ids]
+        return self.lists[name]
+
+    def __contains__(self, name) -> bool:
+        if name in self.lists:
+            return True
+        return name not in self.deleted and bool(self.lookup(name))
+
+    def __setitem__(self, name: str, packages: List['Package']):
+        self.lists[name] = packages
+        self.deleted.discard(name)
+
+    def __delitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        self.lists.pop(name, None)
+        if self.lookup(name):
+            self.deleted.add(name)
+
+    def __iter__(self):
+        names = set(self.lists)
+        yield from list(self.lists)
+        for name in self.names():
+            if name not in names and name not in self.deleted:
+                yield name
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class MappedSystem(System):
+    """
+    System serving the packages of a memory mapped PackageIndex, see: System.load_snapshot
+    Lookups are being served by the index, packages are being materialized lazily.
+    """
+    # names of the lists of packages with the types they contain
+    types_lists = {
+        'repo_packages_list': PossibleTypes.REPO_PACKAGE,
+        'aur_packages_list': PossibleTypes.AUR_PACKAGE,
+        'devel_packages_list': PossibleTypes.DEVEL_PACKAGE,
+        'not_repo_not_aur_packages_list': PossibleTypes.PACKAGE_NOT_REPO_NOT_AUR
+    }
+
+    def __init__(self, index: PackageIndex):
+        self.index = index
+        self.all_packages_dict = MappedPackages(index)
+        self.provides_dict = MappedReverseDict(self.all_packages_dict, index.providing, index.provided_names)
+        self.conflicts_dict = MappedReverseDict(self.all_packages_dict, index.conflicting, index.conflicting_names)
+
+    def __getattr__(self, name: str):
+        # the lists of packages by type are being materialized on first access
+        if name not in MappedSystem.types_lists:
+            raise AttributeError(name)
+
+        # only packages of the given type are being materialized, deleted and replaced packages are skipped.
+        # packages added after loading are not contained, append_packages appends them to the list afterwards,
+        # just like for a System
+        packages_dict = self.all_packages_dict
+        type_of = MappedSystem.types_lists[name]
+        packages = [packages_dict.package(record_id) for record_id in range(len(self.index))
+                    if self.index.type_of(record_id) == type_of.name
+                    and self.index.name(record_id) not in packages_dict.deleted
+                    and self.index.name(record_id) not in packages_dict.added]
+        setattr(self, name, packages)
+        return packages
+
+    def recreate_dicts(self):
+        System.__init__(self, list(self.all_packages_dict.values()))
+
+
+def _hypothetical_append_to_forked_system(solution: List['Package']) -> Tuple[List[str], List[str]]:
+    """
+    Worker for System.hypothetical_append_solutions_to_system.
+    Runs in a forked process, hence System.forked_system is available without being pickled.
+
+    :param solution:    The solution to append
+    :return:            Tuple containing the names of the removed packages of the forked system
+                        and the names of the added packages of the solution
+    """
+    system = System.forked_system
+    new_system = system.hypothetical_append_packages_to_system(solution)
+    removed_names = [package.name for package in system.all_packages_dict.values()
+                     if new_system.all_packages_dict.get(package.name) is not package]
+    added_names = [package.name for package in new_system.all_packages_dict.values()
+                   if system.all_packages_dict.get(package.name) is not package]
+
+    return removed_names, added_names
@@ -0,0 +1,65 @@
+import logging
+import os
+from typing import List, Iterable
+
+from aurman.pacman_db import installed_packages_names
+from aurman.wrappers import pacman
+
+
+class InstallReasonJournal:
+    """
+    Journal of the packages to mark as explicitly installed.
+    All packages are installed as deps and the explicit ones are marked with one pacman call at the end.
+    The names are written to a file after every transaction,
+    hence the install reasons are fixed on the next run if aurman has been interrupted.
+    """
+
+    def __init__(self, path: str):
+        """
+        :param path:    The path of the journal file
+        """
+        self.path = path
+
+    def add(self, names: Iterable[str]):
+        """
+        Adds names of installed packages to mark as explicitly installed
+
+        :param names:   The names of the packages
+        """
+        names = list(names)
+        if not names:
+            return
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write("".join("{}\n".format(name) for name in names))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def pending(self) -> List[str]:
+        """
+        :return:    The names of the packages to mark as explicitly installed, in order and without duplicates
+        """
+        try:
+            with open(self.path, "r") as f:
+                names = [line.strip() for line in f]
+        except FileNotFoundError:
+            return []
+
+        return list(dict.fromkeys(name for name in names if name))
+
+    def apply(self):
+        """
+        Marks the journaled packages, which are still installed, as explicitly installed
+        and removes the journal
+        """
+        names = self.pending()
+        if names:
+            installed_names = installed_packages_names()
+            names = [name for name in names if name in installed_names]
+            logging.debug("marking {} as explicitly installed".format(names))
+            if names:
+                pacman("-D --asexplicit {}".format(" ".join(names)), True, sudo=True)
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,15 +1,21 @@
 import logging
 import os
 import sys
+from concurrent.futures import ThreadPoolExecutor, Future
 from copy import deepcopy
 from subprocess import run, DEVNULL
 from sys import argv, stdout
+from typing import Sequence, Dict
 
 from aurman.bash_completion import possible_completions
+from aurman.binary_cache import BinaryCache
+from aurman.build_scheduler import BuildScheduler, ResourceGovernor
 from aurman.classes import System, Package, PossibleTypes
 from aurman.coloring import aurman_error, aurman_status, aurman_note, Colors
 from aurman.help_printing import aurman_help
+from aurman.install_reasons import InstallReasonJournal
 from aurman.own_exceptions import InvalidInput
+from aurman.pacman_db import read_local_db
 from aurman.parse_args import PacmanOperations, parse_pacman_args
 from aurman.parsing_config import read_config, packages_from_other_sources, AurmanConfig
 from aurman.utilities import acquire_sudo, version_comparison, search_and_print, ask_user
@@ -140,6 +146,59 @@ def process(args):
     ignore_arch = 'miscellaneous' in AurmanConfig.aurman_config and \
                   'ignore_arch' in AurmanConfig.aurman_config['miscellaneous']
 
+    # number of aur packages being built at the same time
+    build_jobs = 1
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'build_jobs' in AurmanConfig.aurman_config['miscellaneous']:
+        try:
+            build_jobs = int(AurmanConfig.aurman_config['miscellaneous']['build_jobs'])
+        except (TypeError, ValueError):
+            aurman_error("build_jobs in the aurman config has to be a number")
+            sys.exit(1)
+
+    # build the next aur packages while installing
+    pipelined_builds = 'miscellaneous' in AurmanConfig.aurman_config \
+                       and 'pipelined_builds' in AurmanConfig.aurman_config['miscellaneous']
+
+    # download the sources of reviewed packages while reviewing the others
+    prefetch_sources = 'miscellaneous' in AurmanConfig.aurman_config \
+                       and 'prefetch_sources' in AurmanConfig.aurman_config['miscellaneous']
+
+    # cores to use for concurrent builds and memory in MiB needed per core
+    build_cores = None
+    build_memory_per_core = 512
+    try:
+        if 'miscellaneous' in AurmanConfig.aurman_config \
+                and 'build_cores' in AurmanConfig.aurman_config['miscellaneous']:
+            build_cores = int(AurmanConfig.aurman_config['miscellaneous']['build_cores'])
+        if 'miscellaneous' in AurmanConfig.aurman_config \
+                and 'build_memory_per_core' in AurmanConfig.aurman_config['miscellaneous']:
+            build_memory_per_core = int(AurmanConfig.aurman_config['miscellaneous']['build_memory_per_core'])
+    except (TypeError, ValueError):
+        aurman_error("build_cores and build_memory_per_core in the aurman config have to be numbers")
+        sys.exit(1)
+
+    Package.shared_object_store = 'miscellaneous' in AurmanConfig.aurman_config and \
+                                  'shared_object_store' in AurmanConfig.aurman_config['miscellaneous']
+
+    # directory of built package files shared between runs and machines
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'binary_cache_dir' in AurmanConfig.aurman_config['miscellaneous']:
+        binary_cache_dir = AurmanConfig.aurman_config['miscellaneous']['binary_cache_dir']
+        if not binary_cache_dir:
+            aurman_error("binary_cache_dir in the aurman config has to be a directory")
+            sys.exit(1)
+        Package.binary_cache = BinaryCache(os.path.expanduser(binary_cache_dir))
+
+    # pacman repository database to add the built packages to
+    if 'miscellaneous' in AurmanConfig.aurman_config \
+            and 'local_repo' in AurmanConfig.aurman_config['miscellaneous']:
+        local_repo = AurmanConfig.aurman_config['miscellaneous']['local_repo']
+        if not local_repo or ".db.tar" not in os.path.basename(local_repo):
+            aurman_error("local_repo in the aurman config has to be a repository database, e.g. custom.db.tar.gz")
+            sys.exit(1)
+        Package.local_repo = os.path.expanduser(local_repo)
+
     # do not allow -y without -u
     if pacman_args.refresh and not sysupgrade:
         aurman_error("-y without -u is not allowed!")
@@ -181,17 +240,14 @@ def process(args):
                     aurman_status("Deleting uninstalled clones from cache...")
 
                     # if pkgbase not available, the name of the package is the base
-                    expac_returns = expac("-Q -1", ("e", "n"), ())
-                    dirs_to_not_delete = set()
-                    for expac_return in expac_returns:
-                        pkgbase = expac_return.split("?!")[0]
-                        if pkgbase == "(null)":
-                            dirs_to_not_delete.add(expac_return.split("?!")[1])
-                        else:
-                            dirs_to_not_delete.add(pkgbase)
+                    try:
+                        dirs_to_not_delete = set([package['pkgbase'] for package in read_local_db().values()])
+                    except InvalidInput:
+                        sys.exit(1)
 
                     for thing in os.listdir(Package.cache_dir):
-                        if os.path.isdir(os.path.join(Package.cache_dir, thing)):
+                        if os.path.isdir(os.path.join(Package.cache_dir, thing)) \
+                                and thing != Package.shared_object_store_name:
                             if thing not in dirs_to_not_delete:
                                 dir_to_delete = os.path.join(Package.cache_dir, thing)
                                 if run("rm -rf {}".format(dir_to_delete), shell=True, stdout=DEVNULL,
@@ -200,13 +256,16 @@ def process(args):
                                                  "".format(Colors.BOLD(Colors.LIGHT_MAGENTA(dir_to_delete))))
                                     sys.exit(1)
 
+                    Package.prune_shared_object_store(dirs_to_not_delete)
+
                 if not noconfirm and \
                         ask_user("Do you want to remove {} from cache? ({})"
                                  "".format(Colors.BOLD(Colors.LIGHT_MAGENTA("all untracked git files")),
                                            Colors.BOLD(Colors.LIGHT_MAGENTA("even from installed packages"))), False):
                     aurman_status("Deleting untracked git files from cache...")
                     for thing in os.listdir(Package.cache_dir):
-                        if os.path.isdir(os.path.join(Package.cache_dir, thing)):
+                        if os.path.isdir(os.path.join(Package.cache_dir, thing)) \
+                                and thing != Package.shared_object_store_name:
                             dir_to_clean = os.path.join(Package.cache_dir, thing)
                             if run("git clean -ffdx"
                                    "", shell=True, stdout=DEVNULL, stderr=DEVNULL, cwd=dir_to_clean).returncode != 0:
@@ -221,7 +280,7 @@ def process(args):
         # we only need the installed system for aur queries
         if not repo:
             try:
-                installed_system = System(System.get_installed_packages())
+                installed_system = System.get_installed_system()
             except InvalidInput:
                 sys.exit(1)
         else:
@@ -290,7 +349,7 @@ def process(args):
 
     # analyzing installed packages
     try:
-        installed_system = System(System.get_installed_packages())
+        installed_system = System.get_installed_system()
     except InvalidInput:
         sys.exit(1)
 
@@ -303,7 +362,7 @@ def process(args):
 
     # fetching upstream repo packages...
     try:
-        upstream_system = System(System.get_repo_packages())
+        upstream_system = System.get_repo_system()
     except InvalidInput:
         sys.exit(1)
 
@@ -367,9 +426,8 @@ def process(args):
     # if user entered --devel and not --repo, fetch all needed pkgbuilds etc. for the devel packages
     if devel and not repo:
         aurman_status("looking for new pkgbuilds of devel packages and fetch them...")
-        for package in upstream_system.devel_packages_list:
-            if package.name not in ignored_packages_names:
-                package.fetch_pkgbuild()
+        Package.fetch_pkgbuilds([package for package in upstream_system.devel_packages_list
+                                 if package.name not in ignored_packages_names])
         try:
             for package in upstream_system.devel_packages_list:
                 if package.name not in ignored_packages_names:
@@ -442,89 +500,125 @@ def process(args):
         aurman_note("nothing to do... everything is up to date")
         sys.exit(0)
 
+    def as_explicit(package: Package) -> bool:
+        return package.name in sanitized_names and package.name not in sanitized_not_to_be_removed \
+               or ((package.name in installed_system.all_packages_dict)
+                   and (installed_system.all_packages_dict[package.name].install_reason == 'explicit'))
+
+    def pacman_calls(packages: Sequence[Package]) -> int:
+        # one transaction per install batch, the install reasons are set at the end
+        return len(BuildScheduler(System.calc_install_chunks(packages), installed_system).install_batches)
+
+    # install the repo packages in as few chunks as possible
+    reordered_solution = installed_system.reorder_for_install_chunks(chosen_solution)
+    saved_pacman_calls = pacman_calls(chosen_solution) - pacman_calls(reordered_solution)
+    if saved_pacman_calls > 0:
+        aurman_note("reordering the installation saves {} pacman calls".format(saved_pacman_calls))
+        chosen_solution = reordered_solution
+
     try:
         installed_system.show_solution_differences_to_user(chosen_solution, upstream_system, noconfirm,
                                                            not only_unfulfilled_deps, solution_way)
     except InvalidInput:
         sys.exit(1)
 
-    if not repo:
-        aurman_status("looking for new pkgbuilds and fetch them...")
-        for package in chosen_solution:
-            if package.type_of is PossibleTypes.REPO_PACKAGE \
-                    or devel and package.type_of is PossibleTypes.DEVEL_PACKAGE:
-                continue
-            package.fetch_pkgbuild()
+    # pkgbases as keys and their source prefetches as values
+    prefetches: Dict[str, Future] = {}
+    prefetch_executor = ThreadPoolExecutor(max_workers=Package.max_fetch_workers) if prefetch_sources else None
+
+    try:
+        if not repo:
+            aurman_status("looking for new pkgbuilds and fetch them...")
+            Package.fetch_pkgbuilds([package for package in chosen_solution
+                                     if not (package.type_of is PossibleTypes.REPO_PACKAGE
+                                             or devel and package.type_of is PossibleTypes.DEVEL_PACKAGE)])
+            try:
+                for package in chosen_solution:
+                    if package.type_of is PossibleTypes.REPO_PACKAGE \
+                            or devel and package.type_of is PossibleTypes.DEVEL_PACKAGE:
+                        continue
+                    package.show_pkgbuild(noedit, show_changes, pgp_fetch, keyserver, always_edit, default_show_changes)
+
+                    if prefetch_executor is not None and package.pkgbase not in prefetches:
+                        prefetches[package.pkgbase] = prefetch_executor.submit(package.prefetch_sources)
+            except InvalidInput:
+                sys.exit(1)
+
+        # install packages
+        if not sudo_acquired:
+            acquire_sudo()
+            sudo_acquired = True
+
+        # set the install reasons left over by an interrupted run
+        install_reason_journal = InstallReasonJournal(os.path.join(Package.cache_dir, "aurman_install_reasons"))
         try:
-            for package in chosen_solution:
-                if package.type_of is PossibleTypes.REPO_PACKAGE \
-                        or devel and package.type_of is PossibleTypes.DEVEL_PACKAGE:
-                    continue
-                package.show_pkgbuild(noedit, show_changes, pgp_fetch, keyserver, always_edit, default_show_changes)
+            install_reason_journal.apply()
         except InvalidInput:
             sys.exit(1)
 
-    # install packages
-    if not sudo_acquired:
-        acquire_sudo()
-        sudo_acquired = True
-
-    # repo packages to install from other sources
-    repo_packages_dict = packages_from_other_sources()[1]
-
-    # generate pacman args for the aur packages
-    pacman_args_copy = deepcopy(pacman_args)
-    pacman_args_copy.operation = PacmanOperations.UPGRADE
-    pacman_args_copy.targets = []
-
-    args_for_explicit = str(pacman_args_copy)
-    pacman_args_copy.asdeps = True
-    pacman_args_copy.asexplicit = False
-    args_for_dependency = str(pacman_args_copy)
-
-    # calc chunks to install
-    solution_packages_chunks = System.calc_install_chunks(chosen_solution)
-
-    # install the chunks
-    for package_chunk in solution_packages_chunks:
-        # repo chunk
-        if package_chunk[0].type_of is PossibleTypes.REPO_PACKAGE:
-            # container for explicit repo deps
-            as_explicit_container = set()
-            for package in package_chunk:
-                if package.name in sanitized_names and package.name not in sanitized_not_to_be_removed \
-                        or ((package.name in installed_system.all_packages_dict)
-                            and (installed_system.all_packages_dict[package.name].install_reason == 'explicit')):
-                    as_explicit_container.add(package.name)
-
-            pacman_args_copy = deepcopy(pacman_args)
-            pacman_args_copy.targets = [package.name for package in package_chunk if
-                                        package.name not in repo_packages_dict]
-
-            pacman_args_copy.targets.extend(["{}/".format(repo_packages_dict[package.name]) + package.name
-                                             for package in package_chunk if package.name in repo_packages_dict])
-            pacman_args_copy.asdeps = True
-            pacman_args_copy.asexplicit = False
-            try:
+        # repo packages to install from other sources
+        repo_packages_dict = packages_from_other_sources()[1]
+
+        # generate pacman args for the aur packages
+        pacman_args_copy = deepcopy(pacman_args)
+        pacman_args_copy.operation = PacmanOperations.UPGRADE
+        pacman_args_copy.targets = []
+
+        pacman_args_copy.asdeps = True
+        pacman_args_copy.asexplicit = False
+        args_for_dependency = str(pacman_args_copy)
+
+        # calc chunks to install
+        solution_packages_chunks = System.calc_install_chunks(chosen_solution)
+
+        def build(package: Package, log_file: str, jobs: int):
+            # the build must not download the sources while they are being prefetched
+            if package.pkgbase in prefetches:
+                prefetches[package.pkgbase].result()
+            package.build(ignore_arch, rebuild, log_file, jobs)
+
+        def install(package_chunk: Sequence[Package]):
+            # everything is installed as deps, the explicit packages are marked at the end.
+            # journaled before installing, so an interruption after the transaction can not lose them,
+            # names of packages not installed in the end are ignored, see: InstallReasonJournal.apply
+            # aur packages stay deps, if the user wants that
+            if package_chunk[0].type_of is PossibleTypes.REPO_PACKAGE or not pacman_args.asdeps:
+                install_reason_journal.add(package.name for package in package_chunk if as_explicit(package))
+
+            # repo chunk
+            if package_chunk[0].type_of is PossibleTypes.REPO_PACKAGE:
+                pacman_args_copy = deepcopy(pacman_args)
+                pacman_args_copy.targets = [package.name for package in package_chunk if
+                                            package.name not in repo_packages_dict]
+
+                pacman_args_copy.targets.extend(["{}/".format(repo_packages_dict[package.name]) + package.name
+                                                 for package in package_chunk if package.name in repo_packages_dict])
+                pacman_args_copy.asdeps = True
+                pacman_args_copy.asexplicit = False
                 pacman(str(pacman_args_copy), False, use_ask=True)
-            except InvalidInput:
-                sys.exit(1)
+            # consecutive aur chunks are being installed at once
+            else:
+                Package.install_packages(package_chunk, args_for_dependency, use_ask=True)
 
-            if as_explicit_container:
-                pacman("-D --asexplicit {}".format(" ".join(as_explicit_container)), True, sudo=True)
-        # aur chunks always consist of one package
-        else:
-            package = package_chunk[0]
+        # build and install the chunks
+        try:
+            BuildScheduler(solution_packages_chunks, installed_system, build_jobs,
+                           ResourceGovernor(build_cores, build_memory_per_core), pipelined_builds).run(build, install)
+        except InvalidInput:
+            sys.exit(1)
+        finally:
+            # must not mask why building or installing failed, the journal is kept for the next run in case of errors
             try:
-                package.build(ignore_arch, rebuild)
-                if package.name in sanitized_names and package.name not in sanitized_not_to_be_removed \
-                        or ((package.name in installed_system.all_packages_dict)
-                            and (installed_system.all_packages_dict[package.name].install_reason == 'explicit')):
-                    package.install(args_for_explicit, use_ask=True)
-                else:
-                    package.install(args_for_dependency, use_ask=True)
-            except InvalidInput:
-                sys.exit(1)
+                install_reason_journal.apply()
+            except (InvalidInput, OSError):
+                logging.error("setting the install reasons failed", exc_info=True)
+                aurman_error("Setting the install reasons failed, it will be retried on the next run")
+    finally:
+        # prefetches not started yet are not needed anymore, no matter how this run ends
+        if prefetch_executor is not None:
+            for prefetch in prefetches.values():
+                prefetch.cancel()
+            prefetch_executor.shutdown()
 
 
 def main():
@@ -58,7 +58,7 @@ class SolutionEncoder(json.JSONEncoder):
         if isinstance(obj, set):
             return list(obj)
         if isinstance(obj, Package):
-            return obj.__dict__
+            return {attribute: getattr(obj, attribute) for attribute in Package.attributes}
         return json.JSONEncoder.default(self, obj)
 
 
@@ -112,7 +112,7 @@ def process(args):
 
     # analyzing installed packages
     try:
-        installed_system = System(System.get_installed_packages())
+        installed_system = System.get_installed_system()
     except InvalidInput:
         sys.exit(1)
 
@@ -123,7 +123,7 @@ def process(args):
 
     # fetching upstream repo packages...
     try:
-        upstream_system = System(System.get_repo_packages())
+        upstream_system = System.get_repo_system()
     except InvalidInput:
         sys.exit(1)
 
@@ -0,0 +1,260 @@
+import marshal
+import mmap
+import os
+import struct
+import sys
+from array import array
+from typing import Dict, List, Sequence, Tuple, Union, Any
+
+# layout of an index file, all numbers are unsigned 32 bit little endian integers:
+#
+# magic bytes
+# header with the lengths of the following parts
+# the key of the index (marshal), padded to 4 bytes
+# string table: offsets of the strings, followed by the utf8 encoded strings, padded to 4 bytes
+# package records: fixed width, string ids for the string fields, (start, count) into the lists for the list fields
+# lists: string ids
+# provides: sorted string ids of the provided names, offsets into the record ids, record ids
+# conflicts: same as provides
+#
+# the records are sorted by the bytes of the names, hence a package can be found by binary search
+# same for the provided and conflicting names
+
+index_magic = b"AURMIDX1"
+index_header = struct.Struct("<9I")
+# string fields of the packages, None is stored as none_id
+string_fields = ('name', 'version', 'pkgbase', 'install_reason', 'repo', 'type_of')
+# list fields of the packages, None is stored with count none_id
+list_fields = ('depends', 'conflicts', 'optdepends', 'provides', 'replaces', 'makedepends', 'checkdepends', 'groups')
+record_width = len(string_fields) + 2 * len(list_fields)
+none_id = 0xFFFFFFFF
+
+
+def padding(length: int) -> bytes:
+    """
+    Returns the padding needed to align data of "length" to 4 bytes
+
+    :param length:  The length of the data
+    :return:        The padding bytes
+    """
+    return b"\0" * (-length % 4)
+
+
+def write_package_index(path: str, key: Any, packages: Sequence[Dict[str, Union[str, Sequence[str], None]]],
+                        provides_index: Dict[str, Sequence[int]], conflicts_index: Dict[str, Sequence[int]]):
+    """
+    Writes an index file atomically.
+
+    :param path:                The path of the index file
+    :param key:                 The key of the index, has to be marshallable
+    :param packages:            The packages as dicts containing the string_fields and list_fields as keys
+    :param provides_index:      Dict containing provided names as keys and the indices of the providing packages
+                                in "packages" as values
+    :param conflicts_index:     Same as provides_index for conflicts
+    """
+    strings: List[bytes] = []
+    string_ids: Dict[str, int] = {}
+
+    def string_id(string: Union[str, None]) -> int:
+        if string is None:
+            return none_id
+        if string not in string_ids:
+            string_ids[string] = len(strings)
+            strings.append(string.encode("utf8"))
+        return string_ids[string]
+
+    order = sorted(range(len(packages)), key=lambda i: packages[i]['name'].encode("utf8"))
+    new_positions = {old_position: new_position for new_position, old_position in enumerate(order)}
+
+    records: List[int] = []
+    lists: List[int] = []
+    for i in order:
+        package = packages[i]
+        records.extend(string_id(package[field]) for field in string_fields)
+        for field in list_fields:
+            values = package[field]
+            if values is None:
+                records.extend((0, none_id))
+            else:
+                records.extend((len(lists), len(values)))
+                lists.extend(string_id(value) for value in values)
+
+    def reverse_index(index: Dict[str, Sequence[int]]) -> Tuple[List[int], List[int], List[int]]:
+        names = sorted(index, key=lambda name: name.encode("utf8"))
+        keys = [string_id(name) for name in names]
+        offsets = [0]
+        values = []
+        for name in names:
+            values.extend(sorted(new_positions[position] for position in index[name]))
+            offsets.append(len(values))
+        return keys, offsets, values
+
+    provides_keys, provides_offsets, provides_values = reverse_index(provides_index)
+    conflicts_keys, conflicts_offsets, conflicts_values = reverse_index(conflicts_index)
+
+    string_offsets = [0]
+    for string in strings:
+        string_offsets.append(string_offsets[-1] + len(string))
+    strings_bytes = b"".join(strings)
+    key_bytes = marshal.dumps(key)
+
+    def u32_array(values: Sequence[int]) -> bytes:
+        return struct.pack("<{}I".format(len(values)), *values)
+
+    path_tmp = "{}.tmp{}".format(path, os.getpid())
+    with open(path_tmp, "wb") as f:
+        f.write(index_magic)
+        f.write(index_header.pack(len(key_bytes), len(strings), len(strings_bytes), len(order), len(lists),
+                                  len(provides_keys), len(provides_values), len(conflicts_keys),
+                                  len(conflicts_values)))
+        f.write(key_bytes + padding(len(key_bytes)))
+        f.write(u32_array(string_offsets))
+        f.write(strings_bytes + padding(len(strings_bytes)))
+        for values in (records, lists, provides_keys, provides_offsets, provides_values, conflicts_keys,
+                       conflicts_offsets, conflicts_values):
+            f.write(u32_array(values))
+    os.replace(path_tmp, path)
+
+
+class PackageIndex:
+    """
+    Read only access to a memory mapped index file, see write_package_index
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self.mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self.mmap[:len(index_magic)] != index_magic:
+            raise ValueError("{} is not an index file".format(path))
+
+        position = len(index_magic)
+        (key_length, strings_count, strings_length, self.records_count, lists_length, provides_count,
+         provides_length, conflicts_count, conflicts_length) = index_header.unpack_from(self.mmap, position)
+        position += index_header.size
+
+        self.key = marshal.loads(self.mmap[position:position + key_length])
+        position += key_length + len(padding(key_length))
+
+        view = memoryview(self.mmap)
+
+        def u32_array(length: int) -> Union[memoryview, array]:
+            nonlocal position
+            data = view[position:position + 4 * length]
+            position += 4 * length
+            # the file is little endian, the mapped data may only be used in place on little endian machines
+            if sys.byteorder == "little" and struct.calcsize("I") == 4:
+                return data.cast("I")
+            return array("I", struct.unpack("<{}I".format(length), data))
+
+        self.string_offsets = u32_array(strings_count + 1)
+        self.strings_position = position
+        position += strings_length + len(padding(strings_length))
+        self.records = u32_array(self.records_count * record_width)
+        self.lists = u32_array(lists_length)
+        self.provides = (u32_array(provides_count), u32_array(provides_count + 1), u32_array(provides_length))
+        self.conflicts = (u32_array(conflicts_count), u32_array(conflicts_count + 1), u32_array(conflicts_length))
+
+        if position != len(self.mmap):
+            raise ValueError("{} is corrupted".format(path))
+
+        self.strings_cache: Dict[int, str] = {}
+
+    def __len__(self):
+        return self.records_count
+
+    def string_bytes(self, string_id: int) -> bytes:
+        start = self.strings_position + self.string_offsets[string_id]
+        return self.mmap[start:self.strings_position + self.string_offsets[string_id + 1]]
+
+    def string(self, string_id: int) -> Union[str, None]:
+        if string_id == none_id:
+            return None
+        if string_id not in self.strings_cache:
+            self.strings_cache[string_id] = self.string_bytes(string_id).decode("utf8")
+        return self.strings_cache[string_id]
+
+    def name(self, record_id: int) -> str:
+        return self.string(self.records[record_id * record_width])
+
+    def type_of(self, record_id: int) -> str:
+        return self.string(self.records[record_id * record_width + string_fields.index('type_of')])
+
+    def find(self, name: str) -> int:
+        """
+        Finds a package by name
+
+        :param name:    The name of the package
+        :return:        The record id of the package, -1 if not found
+        """
+        return self.search(name, self.records_count, lambda i: self.records[i * record_width])
+
+    def search(self, name: str, count: int, string_id_at) -> int:
+        """
+        Searches for a name in string ids sorted by their bytes
+
+        :param name:            The name to search for
+        :param count:           The number of string ids
+        :param string_id_at:    Function returning the i-th string id
+        :return:                The position of the name, -1 if not found
+        """
+        name_bytes = name.encode("utf8")
+        low = 0
+        high = count
+        while low < high:
+            middle = (low + high) // 2
+            if self.string_bytes(string_id_at(middle)) < name_bytes:
+                low = middle + 1
+            else:
+                high = middle
+        if low < count and self.string_bytes(string_id_at(low)) == name_bytes:
+            return low
+        return -1
+
+    def reverse_lookup(self, reverse_index: Tuple[Sequence[int], Sequence[int], Sequence[int]], name: str) -> List[int]:
+        keys, offsets, values = reverse_index
+        position = self.search(name, len(keys), lambda i: keys[i])
+        if position == -1:
+            return []
+        return list(values[offsets[position]:offsets[position + 1]])
+
+    def providing(self, name: str) -> List[int]:
+        """
+        :param name:    The provided name without versioning
+        :return:        The record ids of the packages providing the name
+        """
+        return self.reverse_lookup(self.provides, name)
+
+    def conflicting(self, name: str) -> List[int]:
+        """
+        :param name:    The conflicting name without versioning
+        :return:        The record ids of the packages conflicting with the name
+        """
+        return self.reverse_lookup(self.conflicts, name)
+
+    def provided_names(self) -> List[str]:
+        return [self.string(string_id) for string_id in self.provides[0]]
+
+    def conflicting_names(self) -> List[str]:
+        return [self.string(string_id) for string_id in self.conflicts[0]]
+
+    def record(self, record_id: int) -> Dict[str, Union[str, List[str], None]]:
+        """
+        Materializes a package record
+
+        :param record_id:   The record id of the package
+        :return:            Dict containing the string_fields and list_fields as keys
+        """
+        start = record_id * record_width
+        to_return = {}
+        for i, field in enumerate(string_fields):
+            to_return[field] = self.string(self.records[start + i])
+        for i, field in enumerate(list_fields):
+            list_start = self.records[start + len(string_fields) + 2 * i]
+            list_count = self.records[start + len(string_fields) + 2 * i + 1]
+            if list_count == none_id:
+                to_return[field] = None
+            else:
+                to_return[field] = [self.string(string_id) for string_id in
+                                    self.lists[list_start:list_start + list_count]]
+        return to_return
@@ -0,0 +1,234 @@
+import logging
+import multiprocessing
+import os
+import tarfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict, List, Iterable, Union, Tuple, Set
+
+from aurman.own_exceptions import InvalidInput
+from aurman.wrappers import pacman_conf
+
+# the default database path of pacman, see: https://www.archlinux.org/pacman/pacman.conf.5.html#_options
+default_db_path = os.path.join("/var", "lib", "pacman")
+
+
+def db_path() -> str:
+    """
+    Returns the database path of pacman, "DBPath" of the pacman.conf
+
+    :return:    The database path
+    """
+    db_paths = pacman_conf("DBPath")
+    if not db_paths:
+        return default_db_path
+    return db_paths[0]
+
+
+def parse_desc(content: str) -> Dict[str, List[str]]:
+    """
+    Parses the content of a "desc" file of the pacman database.
+    e.g. "%NAME%\\npackage1\\n\\n%DEPENDS%\\ndep1\\ndep2\\n" -> {"NAME": ["package1"], "DEPENDS": ["dep1", "dep2"]}
+
+    :param content:     The content of the desc file
+    :return:            Dict containing the field names without the enclosing % as keys
+                        and the lines of the fields as values
+    """
+    fields: Dict[str, List[str]] = {}
+    current_values = None
+
+    for line in content.splitlines():
+        if not line:
+            current_values = None
+        elif current_values is None and len(line) > 2 and line.startswith("%") and line.endswith("%"):
+            current_values = fields.setdefault(line[1:len(line) - 1], [])
+        elif current_values is not None:
+            current_values.append(line)
+
+    return fields
+
+
+def package_from_desc(fields: Dict[str, List[str]], repo: str = None) -> Dict[str, Union[str, List[str]]]:
+    """
+    Extracts the fields aurman needs from a parsed "desc" file.
+    The keys are the names of the parameters of aurman.classes.Package
+
+    :param fields:  The parsed desc file, see parse_desc
+    :param repo:    The repo of the sync database the desc file is from,
+                    None for the local database
+    :return:        Dict containing the values of the package
+    """
+    name = fields["NAME"][0]
+
+    to_return = {
+        'name': name,
+        'version': fields["VERSION"][0],
+        'depends': fields.get("DEPENDS", []),
+        'conflicts': [conflict for conflict in fields.get("CONFLICTS", []) if conflict != name],
+        # optional deps are stored as "name: description"
+        'optdepends': [optdepend.split(":")[0].strip() for optdepend in fields.get("OPTDEPENDS", [])],
+        'provides': fields.get("PROVIDES", []),
+        'replaces': fields.get("REPLACES", []),
+        'pkgbase': fields.get("BASE", [name])[0],
+        'groups': fields.get("GROUPS", [])
+    }
+
+    if repo is not None:
+        to_return['repo'] = repo
+    # only available in the local database
+    elif "REASON" in fields and fields["REASON"][0] == "1":
+        to_return['install_reason'] = "dependency"
+    else:
+        to_return['install_reason'] = "explicit"
+
+    return to_return
+
+
+def read_desc_file(path: str) -> Dict[str, Union[str, List[str]]]:
+    """
+    Reads and parses a "desc" file of the pacman database.
+
+    :param path:    The path to the desc file
+    :return:        Dict containing the values of the package, see package_from_desc
+    """
+    with open(path, "rb") as f:
+        content = f.read().decode("utf8", errors="replace")
+
+    return package_from_desc(parse_desc(content))
+
+
+def read_local_db(max_workers: int = None) -> Dict[str, Dict[str, Union[str, List[str]]]]:
+    """
+    Reads the local pacman database, hence the installed packages.
+    see: https://wiki.archlinux.org/index.php/pacman#Querying_package_databases
+
+    :param max_workers:     If given, the desc files are being read with a thread pool of that size
+    :return:                Dict containing the names of the installed packages as keys
+                            and the values of the packages as values, see package_from_desc
+    """
+    local_dir = os.path.join(db_path(), "local")
+    if not os.path.isdir(local_dir):
+        logging.error("local pacman database {} not found".format(local_dir))
+        raise InvalidInput("local pacman database {} not found".format(local_dir))
+
+    desc_paths: List[str] = []
+    with os.scandir(local_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                desc_paths.append(os.path.join(entry.path, "desc"))
+
+    try:
+        if max_workers is not None and max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                packages: Iterable[Dict] = list(executor.map(read_desc_file, desc_paths))
+        else:
+            packages = [read_desc_file(desc_path) for desc_path in desc_paths]
+    except (OSError, KeyError, IndexError):
+        logging.error("reading the local pacman database {} failed".format(local_dir), exc_info=True)
+        raise InvalidInput("reading the local pacman database {} failed".format(local_dir))
+
+    return {package['name']: package for package in packages}
+
+
+def installed_packages_names() -> Set[str]:
+    """
+    Returns the names of the installed packages without reading the desc files.
+    The entries of the local pacman database are named "name-pkgver-pkgrel".
+
+    :return:    Set containing the names of the installed packages
+    """
+    local_dir = os.path.join(db_path(), "local")
+    if not os.path.isdir(local_dir):
+        logging.error("local pacman database {} not found".format(local_dir))
+        raise InvalidInput("local pacman database {} not found".format(local_dir))
+
+    with os.scandir(local_dir) as entries:
+        return {entry.name.rsplit("-", 2)[0] for entry in entries if entry.is_dir()}
+
+
+def read_sync_db(repo: str) -> List[Dict[str, Union[str, List[str]]]]:
+    """
+    Reads the sync database of a repo.
+    The database is being streamed, hence the tarball is being parsed entry by entry.
+
+    :param repo:    The name of the repo
+    :return:        List containing the values of the packages of the repo, see package_from_desc
+    """
+    sync_db = os.path.join(db_path(), "sync", "{}.db".format(repo))
+    if not os.path.isfile(sync_db):
+        logging.warning("sync database {} not found".format(sync_db))
+        return []
+
+    # entries of the database are directories named "name-version",
+    # containing "desc" and for older databases "depends"
+    fields_of_entries: Dict[str, Dict[str, List[str]]] = {}
+    try:
+        with tarfile.open(sync_db, mode="r|*") as tar:
+            for member in tar:
+                entry_name, _, file_name = member.name.rpartition("/")
+                if not member.isfile() or file_name not in ("desc", "depends"):
+                    continue
+
+                content = tar.extractfile(member).read().decode("utf8", errors="replace")
+                fields_of_entries.setdefault(entry_name, {}).update(parse_desc(content))
+
+        return [package_from_desc(fields, repo) for fields in fields_of_entries.values()]
+    except (OSError, EOFError, tarfile.TarError, KeyError, IndexError):
+        logging.debug("reading the sync database {} failed".format(sync_db), exc_info=True)
+        raise InvalidInput("reading the sync database {} failed".format(sync_db))
+
+
+@lru_cache(maxsize=None)
+def read_sync_dbs(repos: Tuple[str, ...]) -> Dict[str, List[Dict[str, Union[str, List[str]]]]]:
+    """
+    Reads the sync databases of the given repos, one forked worker process per repo.
+    Forking is avoided if other threads are running, since their locks would be copied in any state.
+    The result is cached, hence the databases are being read once per process.
+
+    :param repos:   The names of the repos
+    :return:        Dict containing the names of the repos as keys
+                    and the packages of the repos as values, see read_sync_db
+    """
+    if len(repos) < 2 or "fork" not in multiprocessing.get_all_start_methods() or threading.active_count() > 1:
+        return {repo: read_sync_db(repo) for repo in repos}
+
+    with multiprocessing.get_context("fork").Pool(min(len(repos), os.cpu_count() or 1)) as pool:
+        return dict(zip(repos, pool.map(read_sync_db, repos)))
+
+
+def local_db_state() -> Tuple[int, int, int]:
+    """
+    Returns the state of the local database without reading it.
+    Changes of the installed packages or of their install reasons change the state.
+
+    :return:    Tuple containing the mtime of the local database directory,
+                the number of installed packages and the latest mtime of their desc files
+    """
+    local_dir = os.path.join(db_path(), "local")
+    desc_mtimes: List[int] = []
+
+    with os.scandir(local_dir) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                desc_mtimes.append(os.stat(os.path.join(entry.path, "desc")).st_mtime_ns)
+
+    return os.stat(local_dir).st_mtime_ns, len(desc_mtimes), max(desc_mtimes, default=0)
+
+
+def sync_dbs_state() -> List[Tuple[str, int, int]]:
+    """
+    Returns the state of the sync databases without reading them.
+
+    :return:    List containing tuples with the name, the mtime and the size of the sync database files
+    """
+    sync_dir = os.path.join(db_path(), "sync")
+    to_return: List[Tuple[str, int, int]] = []
+
+    with os.scandir(sync_dir) as entries:
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                to_return.append((entry.name, stat.st_mtime_ns, stat.st_size))
+
+    return sorted(to_return)
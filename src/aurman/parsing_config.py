@@ -1,8 +1,10 @@
 import configparser
 import logging
 import os
-from subprocess import run, DEVNULL
-from typing import Tuple, Set, Dict
+import shlex
+import tempfile
+from subprocess import run, DEVNULL, PIPE
+from typing import Tuple, Set, Dict, List, Union
 
 from aurman.coloring import aurman_error, Colors
 from aurman.own_exceptions import InvalidInput
@@ -12,6 +14,29 @@ class AurmanConfig:
     aurman_config = None
 
 
+class PacmanConfig:
+    """
+    The pacman configuration as returned by pacman-conf.
+    pacman-conf is being executed once per process, see read_pacman_conf
+    """
+    # names of the options as keys and all values of the options as values
+    options: Dict[str, List[str]] = None
+    # the repos ordered by occurrence in the pacman.conf
+    repos: List[str] = None
+
+
+class MakepkgConfig:
+    """
+    The makepkg configuration, read once per process, see read_makepkg_conf
+    """
+    # the variables of the makepkg configuration aurman needs
+    variables_names = ('PKGDEST', 'SRCDEST', 'BUILDDIR', 'PKGEXT', 'MAKEFLAGS', 'CARCH')
+    # variables which take precedence over the configuration files if set in the environment
+    environment_variables_names = ('PKGDEST', 'SRCDEST', 'BUILDDIR', 'PKGEXT', 'CARCH')
+    # names of the variables as keys and the values as values, None for unset variables
+    variables: Dict[str, str] = None
+
+
 def read_config() -> 'configparser.ConfigParser':
     """
     Reads the aurman config and returns it
@@ -44,6 +69,169 @@ def read_config() -> 'configparser.ConfigParser':
     return config
 
 
+def parse_pacman_conf(pacman_conf_output: str) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Parses the output of pacman-conf
+
+    :param pacman_conf_output:  The output of pacman-conf
+    :return:                    A tuple containing two items:
+                                    First item:
+                                        Dict containing the names of the options of the [options] section as keys
+                                        and all values of the options as values
+
+                                    Second item:
+                                        List containing the repos ordered by occurrence in the pacman.conf
+    """
+    options: Dict[str, List[str]] = {}
+    repos: List[str] = []
+    section = None
+
+    for line in pacman_conf_output.strip().splitlines():
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:len(line) - 1]
+            if section != "options":
+                repos.append(section)
+        elif section == "options":
+            option, _, value = line.partition("=")
+            options.setdefault(option.strip(), []).append(value.strip())
+
+    return options, repos
+
+
+def read_pacman_conf() -> 'PacmanConfig':
+    """
+    Reads the pacman configuration via pacman-conf, if not read before.
+    see: https://www.archlinux.org/pacman/pacman.conf.5.html
+
+    :return:    The pacman configuration
+    """
+    if PacmanConfig.options is not None:
+        return PacmanConfig
+
+    pacman_conf_return = run("pacman-conf", shell=True, stdout=PIPE, stderr=DEVNULL, universal_newlines=True)
+
+    if pacman_conf_return.returncode != 0:
+        logging.error("pacman-conf not available")
+        raise InvalidInput("pacman-conf not available")
+
+    PacmanConfig.options, PacmanConfig.repos = parse_pacman_conf(pacman_conf_return.stdout)
+
+    return PacmanConfig
+
+
+def makepkg_conf_files() -> List[str]:
+    """
+    Returns the makepkg configuration files in the order makepkg sources them.
+    see: https://www.archlinux.org/pacman/makepkg.conf.5.html
+
+    :return:    List containing the paths of the existing configuration files
+    """
+    makepkg_conf = os.path.join("/etc", "makepkg.conf")
+    if not os.path.isfile(makepkg_conf):
+        logging.error("makepkg.conf not found")
+        raise InvalidInput("makepkg.conf not found")
+
+    to_return = [makepkg_conf]
+
+    makepkg_conf_d = os.path.join("/etc", "makepkg.conf.d")
+    if os.path.isdir(makepkg_conf_d):
+        to_return.extend(sorted(os.path.join(makepkg_conf_d, file_name) for file_name in os.listdir(makepkg_conf_d)
+                                if file_name.endswith(".conf")))
+
+    # only one user configuration, the one in XDG_CONFIG_HOME is preferred
+    user_config_home = os.environ.get("XDG_CONFIG_HOME", os.path.expanduser(os.path.join("~", ".config")))
+    for user_makepkg_conf in (os.path.join(user_config_home, "pacman", "makepkg.conf"),
+                              os.path.expanduser(os.path.join("~", ".makepkg.conf"))):
+        if os.path.isfile(user_makepkg_conf):
+            to_return.append(user_makepkg_conf)
+            break
+
+    return to_return
+
+
+def read_makepkg_conf() -> 'MakepkgConfig':
+    """
+    Reads the makepkg configuration, if not read before.
+    The configuration files are bash scripts, hence they are being sourced by bash
+    and variables set in the environment take precedence like they do for makepkg.
+
+    :return:    The makepkg configuration
+    """
+    if MakepkgConfig.variables is not None:
+        return MakepkgConfig
+
+    # source the files without the variables of the environment taking precedence, they are being applied afterwards
+    environment = {name: value for name, value in os.environ.items()
+                   if name not in MakepkgConfig.environment_variables_names}
+    script = 'for conf in "$@"; do source "$conf" || exit 1; done; printf "%s\\0" {}'.format(
+        " ".join('"${}"'.format(name) for name in MakepkgConfig.variables_names))
+
+    makepkg_conf_return = run(["bash", "-c", script, "bash"] + makepkg_conf_files(), stdout=PIPE, stderr=DEVNULL,
+                              env=environment, universal_newlines=True)
+
+    values = makepkg_conf_return.stdout.split("\0")
+    if makepkg_conf_return.returncode != 0 or len(values) != len(MakepkgConfig.variables_names) + 1:
+        logging.error("Reading the makepkg configuration failed")
+        raise InvalidInput("Reading the makepkg configuration failed")
+
+    variables = {}
+    for name, value in zip(MakepkgConfig.variables_names, values):
+        if name in MakepkgConfig.environment_variables_names and os.environ.get(name):
+            value = os.environ[name]
+        variables[name] = value if value else None
+
+    MakepkgConfig.variables = variables
+
+    return MakepkgConfig
+
+
+def write_makepkg_conf(variables: Dict[str, str]) -> str:
+    """
+    Writes a makepkg configuration to pass to makepkg via --config,
+    which sources the configuration files, including the one of the user, and sets the given variables afterwards.
+    makepkg does not source the configuration of the user itself if --config is given, hence the variables win.
+
+    :param variables:   The names of the variables to set as keys and the values as values
+    :return:            The path of the temporary configuration file, has to be removed by the caller
+    """
+    lines = ["source {}".format(shlex.quote(conf)) for conf in makepkg_conf_files()]
+    lines.extend("{}={}".format(name, shlex.quote(value)) for name, value in variables.items())
+
+    file_descriptor, path = tempfile.mkstemp(prefix="aurman_makepkg_", suffix=".conf")
+    with os.fdopen(file_descriptor, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+    return path
+
+
+def replace_jobs_in_makeflags(makeflags: Union[str, None], jobs: int) -> str:
+    """
+    Replaces the number of jobs in MAKEFLAGS, other flags like --load-average are kept.
+    e.g. ("-j8 -l6", 2) -> "-l6 -j2"
+
+    :param makeflags:   The configured MAKEFLAGS, None if not set
+    :param jobs:        The number of jobs
+    :return:            The new MAKEFLAGS
+    """
+    flags = shlex.split(makeflags) if makeflags else []
+    to_keep = []
+    skip_next = False
+    for i, flag in enumerate(flags):
+        if skip_next:
+            skip_next = False
+            continue
+        if flag in ("-j", "--jobs"):
+            # the number of jobs may be the next flag, "-j" alone means unlimited jobs
+            skip_next = i + 1 < len(flags) and flags[i + 1].isdigit()
+            continue
+        if flag.startswith("--jobs=") or (flag.startswith("-j") and flag[2:].isdigit()):
+            continue
+        to_keep.append(flag)
+
+    to_keep.append("-j{}".format(jobs))
+    return " ".join(shlex.quote(flag) for flag in to_keep)
+
+
 def packages_from_other_sources() -> Tuple[Set[str], Dict[str, str]]:
     """
     Returns the packages which should be installed
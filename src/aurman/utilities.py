@@ -1,8 +1,10 @@
+import atexit
 import logging
-import threading
-import time
-from subprocess import run, DEVNULL, PIPE
-from typing import Tuple, Sequence
+import os
+import shutil
+import tempfile
+from subprocess import run, DEVNULL, PIPE, Popen
+from typing import Tuple, Sequence, Dict, List, Union
 
 import regex
 
@@ -135,6 +137,83 @@ def strip_versioning_from_name(name: str) -> str:
     return split_name_with_versioning(name)[0]
 
 
+def parse_srcinfo(lines: Sequence[str]) -> Dict[str, List[str]]:
+    """
+    Parses the pkgbase section of a .SRCINFO, which is also the output of makepkg --printsrcinfo.
+    see: https://wiki.archlinux.org/index.php/.SRCINFO
+    e.g. ["pkgbase = gunnar", "\tpkgver = 1.0", "pkgname = gunnar"] -> {"pkgbase": ["gunnar"], "pkgver": ["1.0"]}
+
+    :param lines:   The lines of the .SRCINFO
+    :return:        Dict containing the keys of the pkgbase section as keys and all values of the keys as values
+    """
+    fields: Dict[str, List[str]] = {}
+
+    for line in lines:
+        key, separator, value = line.strip().partition(" = ")
+        if not separator:
+            continue
+        # the package sections follow the pkgbase section
+        if key == "pkgname":
+            break
+        fields.setdefault(key, []).append(value)
+
+    return fields
+
+
+def git_head_commit(repo_dir: str) -> Union[str, None]:
+    """
+    Reads the hash of the commit HEAD of a git repository points to, without executing git.
+
+    :param repo_dir:    The directory of the git repository
+    :return:            The hash of the commit, None if it could not be read
+    """
+    git_dir = os.path.join(repo_dir, ".git")
+
+    try:
+        with open(os.path.join(git_dir, "HEAD"), "r") as f:
+            head = f.read().strip()
+
+        if not head.startswith("ref: "):
+            return head
+
+        ref = head[len("ref: "):]
+        ref_file = os.path.join(git_dir, ref)
+        if os.path.isfile(ref_file):
+            with open(ref_file, "r") as f:
+                return f.read().strip()
+
+        with open(os.path.join(git_dir, "packed-refs"), "r") as f:
+            for line in f:
+                commit_hash, _, packed_ref = line.strip().partition(" ")
+                if packed_ref == ref:
+                    return commit_hash
+    except OSError:
+        logging.debug("reading HEAD of {} failed".format(repo_dir), exc_info=True)
+
+    return None
+
+
+def copy_file_atomically(source: str, destination: str):
+    """
+    Copies a file via a temporary file in the directory of the destination,
+    hence the destination is either the old or the complete new file at any time
+
+    :param source:          The path of the file to copy
+    :param destination:     The path to copy the file to
+    """
+    file_descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix=".aurman_",
+                                                       suffix=".tmp")
+    os.close(file_descriptor)
+    try:
+        shutil.copyfile(source, temporary_path)
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, destination)
+    except OSError:
+        os.remove(temporary_path)
+        logging.error("copying {} to {} failed".format(source, destination), exc_info=True)
+        raise InvalidInput("copying {} to {} failed".format(source, destination))
+
+
 def version_comparison(version1: str, comparison_operator: str, version2: str) -> bool:
     """
     Compares two versions.
@@ -159,21 +238,19 @@ def version_comparison(version1: str, comparison_operator: str, version2: str) -
 
 def acquire_sudo():
     """
-    sudo loop since we want sudo forever
+    sudo loop since we want sudo forever.
+    The loop runs in a child process instead of a thread, so that aurman may fork safely.
+    It ignores SIGINT of the terminal and ends with aurman.
     """
-
-    def sudo_loop():
-        while True:
-            if run("sudo -v", shell=True, stdout=DEVNULL).returncode != 0:
-                logging.error("acquire sudo failed")
-            time.sleep(120)
-
     if run("sudo -v", shell=True).returncode != 0:
         logging.error("acquire sudo failed")
         raise InvalidInput("acquire sudo failed")
-    t = threading.Thread(target=sudo_loop)
-    t.daemon = True
-    t.start()
+
+    # the loop stays in the session of aurman, sudo may record the credentials per terminal
+    sudo_loop = Popen("trap '' INT; while kill -0 {} 2>/dev/null; do "
+                      "sudo -v >/dev/null || echo 'acquire sudo failed' >&2; sleep 120; done".format(os.getpid()),
+                      shell=True, stdout=DEVNULL)
+    atexit.register(sudo_loop.terminate)
 
 
 def ask_user(question: str, default: bool, new_line: bool = False) -> bool:
@@ -1,8 +1,9 @@
 import logging
-from subprocess import run, PIPE, DEVNULL
+from subprocess import run, PIPE, DEVNULL, STDOUT
 from typing import Sequence, List
 
 from aurman.own_exceptions import InvalidInput
+from aurman.parsing_config import read_pacman_conf
 
 
 def split_query_helper(max_length: int, base_length_of_query: int, length_per_append: int, to_append: Sequence[str]) -> \
@@ -121,7 +122,7 @@ def pacman(options_as_string: str, fetch_output: bool, dir_to_execute: str = Non
     return []
 
 
-def makepkg(options_as_string: str, fetch_output: bool, dir_to_execute: str) -> List[str]:
+def makepkg(options_as_string: str, fetch_output: bool, dir_to_execute: str, log_file: str = None) -> List[str]:
     """
     makepkg wrapper. see: https://www.archlinux.org/pacman/makepkg.8.html
     provide the makepkg options as string via "options_as_string".
@@ -130,17 +131,26 @@ def makepkg(options_as_string: str, fetch_output: bool, dir_to_execute: str) ->
     :param options_as_string:   the makepkg options as string
     :param fetch_output:        True if you want to receive the output of makepkg, False otherwise
     :param dir_to_execute:      provide the directory in which the makepkg command should be executed
+    :param log_file:            if given and "fetch_output"=False, the output of makepkg is written to this file
+                                instead of being shown
     :return:                    empty list in case of "fetch_output"=False, otherwise the lines of the makepkg output as list.
                                 one line of output is one item in the list.
     """
     makepkg_query = "makepkg {}".format(options_as_string)
     if fetch_output:
         makepkg_return = run(makepkg_query, shell=True, stdout=PIPE, universal_newlines=True, cwd=dir_to_execute)
+    elif log_file is not None:
+        with open(log_file, "w") as f:
+            makepkg_return = run(makepkg_query, shell=True, stdout=f, stderr=STDOUT, cwd=dir_to_execute)
     else:
         makepkg_return = run(makepkg_query, shell=True, cwd=dir_to_execute)
 
     if makepkg_return.returncode != 0:
-        logging.error("makepkg query {} failed in directory {}".format(makepkg_query, dir_to_execute))
+        if log_file is not None and not fetch_output:
+            logging.error("makepkg query {} failed in directory {}, see {}"
+                          "".format(makepkg_query, dir_to_execute, log_file))
+        else:
+            logging.error("makepkg query {} failed in directory {}".format(makepkg_query, dir_to_execute))
         raise InvalidInput("makepkg query {} failed in directory {}".format(makepkg_query, dir_to_execute))
 
     if fetch_output:
@@ -149,24 +159,30 @@ def makepkg(options_as_string: str, fetch_output: bool, dir_to_execute: str) ->
     return []
 
 
+def repo_add(options_as_string: str, database: str, package_files: Sequence[str]):
+    """
+    repo-add wrapper. see: https://www.archlinux.org/pacman/repo-add.8.html
+    adds package files to a repository database or updates their entries.
+
+    :param options_as_string:   the repo-add options as string, e.g. "-R"
+    :param database:            the path of the repository database, e.g. "/srv/repo/custom.db.tar.gz"
+    :param package_files:       the paths of the package files to add
+    """
+    repo_add_query = "repo-add {} '{}' {}".format(options_as_string, database,
+                                                  " ".join("'{}'".format(package_file) for package_file in package_files))
+    repo_add_return = run(repo_add_query, shell=True, stdout=DEVNULL, stderr=PIPE, universal_newlines=True)
+
+    if repo_add_return.returncode != 0:
+        logging.error("repo-add query {} failed: {}".format(repo_add_query, repo_add_return.stderr.strip()))
+        raise InvalidInput("repo-add query {} failed".format(repo_add_query))
+
+
 def pacman_conf(option_as_string: str) -> List[str]:
     """
     returns all values for a given option as received by executing pacman-conf
     e.g. calling with "HoldPkg" returns all "hold packages" declared in the pacman.conf
+    pacman-conf is only being executed once, see aurman.parsing_config.read_pacman_conf
     :param option_as_string: the option to receive the values for
     :return: the values for the given option as strings in a list
     """
-    pacman_conf_return = run("pacman-conf", shell=True, stdout=PIPE, stderr=DEVNULL, universal_newlines=True)
-
-    if pacman_conf_return.returncode != 0:
-        logging.error("pacman-conf not available")
-        raise InvalidInput("pacman-conf not available")
-
-    to_return: List[str] = []
-
-    for line in pacman_conf_return.stdout.strip().splitlines():
-        to_split_at: str = "{} =".format(option_as_string)
-        if line.startswith(to_split_at):
-            to_return.append(line.split(to_split_at)[1].strip())
-
-    return to_return
+    return list(read_pacman_conf().options.get(option_as_string, []))
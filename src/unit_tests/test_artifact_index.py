@@ -0,0 +1,59 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from aurman.artifact_index import parse_package_file_name, ArtifactIndex
+
+
+class TestArtifact_index(TestCase):
+    def test_parse_package_file_name(self):
+        self.assertEqual(("package-1", "1:1.0-2", "x86_64", ".pkg.tar.xz"),
+                         parse_package_file_name("package-1-1:1.0-2-x86_64.pkg.tar.xz"))
+        self.assertEqual(("package", "1.0-1", "any", ".pkg.tar"), parse_package_file_name("package-1.0-1-any.pkg.tar"))
+        self.assertIsNone(parse_package_file_name("package-1.0-1-any.pkg.tar.xz.sig"))
+        self.assertIsNone(parse_package_file_name("PKGBUILD"))
+        self.assertIsNone(parse_package_file_name("1.0-1-any.pkg.tar.xz"))
+
+    def test_racy_mtime(self):
+        with TemporaryDirectory() as directory:
+            index = ArtifactIndex.of_dir(directory)
+            mtime = os.stat(directory).st_mtime_ns
+            open(os.path.join(directory, "package-1.0-1-any.pkg.tar.xz"), "w").close()
+            # the file has been added within the same tick
+            os.utime(directory, ns=(mtime, mtime))
+
+            index.refresh()
+            self.assertEqual("package-1.0-1-any.pkg.tar.xz", index.find("package", "1.0-1"))
+
+            # a miss rescans, if the mtime is too recent to be trusted
+            open(os.path.join(directory, "package-2.0-1-any.pkg.tar.xz"), "w").close()
+            os.utime(directory, ns=(mtime, mtime))
+            self.assertEqual("package-2.0-1-any.pkg.tar.xz", index.find("package", "2.0-1"))
+
+            # but not, if the mtime is old enough to be trusted and did not change
+            index.scan_time = mtime / 10 ** 9 + 10
+            open(os.path.join(directory, "package-3.0-1-any.pkg.tar.xz"), "w").close()
+            os.utime(directory, ns=(mtime, mtime))
+            self.assertIsNone(index.find("package", "3.0-1"))
+
+    def test_artifact_index(self):
+        with TemporaryDirectory() as directory:
+            for file_name in ("package-1.0-1-any.pkg.tar.xz", "package-1.0-1-any.pkg.tar.zst", "PKGBUILD"):
+                open(os.path.join(directory, file_name), "w").close()
+
+            index = ArtifactIndex.of_dir(directory)
+            self.assertEqual("package-1.0-1-any.pkg.tar.zst", index.find("package", "1.0-1", pkgext=".pkg.tar.zst"))
+            self.assertEqual("package-1.0-1-any.pkg.tar.xz", index.find("package", "1.0-1"))
+            self.assertIsNone(index.find("package", "1.0-1", arch="x86_64"))
+            self.assertIsNone(index.find("package", "2.0-1"))
+
+            os.remove(os.path.join(directory, "package-1.0-1-any.pkg.tar.xz"))
+            open(os.path.join(directory, "package-2.0-1-any.pkg.tar.xz"), "w").close()
+            # the mtime of the directory may not have changed in between on coarse file systems
+            index = ArtifactIndex.of_dir(directory)
+            self.assertEqual("package-1.0-1-any.pkg.tar.zst", index.find("package", "1.0-1", pkgext=".pkg.tar.xz"))
+            self.assertEqual("package-2.0-1-any.pkg.tar.xz", index.find("package", "2.0-1"))
+
+
+if __name__ == '__main__':
+    main()
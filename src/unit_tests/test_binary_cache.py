@@ -0,0 +1,64 @@
+import os
+import tempfile
+import time
+from subprocess import run, DEVNULL
+from unittest import TestCase, main
+
+from aurman.artifact_index import package_files_since
+from aurman.binary_cache import BinaryCache
+
+
+class TestBinary_cache(TestCase):
+    def test_tree_hash(self):
+        with tempfile.TemporaryDirectory() as package_dir:
+            with open(os.path.join(package_dir, "PKGBUILD"), "w") as f:
+                f.write("pkgname=package1\n")
+            run("git init -q && git add PKGBUILD", shell=True, cwd=package_dir, stdout=DEVNULL, stderr=DEVNULL)
+            tree_hash = BinaryCache.tree_hash(package_dir)
+
+            # untracked files do not matter
+            with open(os.path.join(package_dir, "package1-1.0-1-x86_64.pkg.tar.xz"), "w") as f:
+                f.write("built")
+            self.assertEqual(tree_hash, BinaryCache.tree_hash(package_dir))
+
+            # changes of the reviewed files do
+            with open(os.path.join(package_dir, "PKGBUILD"), "a") as f:
+                f.write("pkgrel=2\n")
+            self.assertNotEqual(tree_hash, BinaryCache.tree_hash(package_dir))
+
+    def test_publish_and_fetch(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            binary_cache = BinaryCache(os.path.join(tmp_dir, "cache"))
+            build_dir = os.path.join(tmp_dir, "build")
+            os.makedirs(build_dir)
+            key = ("base1", "1:1.0-1", "x86_64", "0123")
+
+            build_start = time.time() - 1
+            for file_name in ("package1-1:1.0-1-x86_64.pkg.tar.xz", "package2-1:1.0-1-any.pkg.tar.xz",
+                              "package2-1:1.0-1-any.pkg.tar.xz.sig", "package1-1:0.9-1-x86_64.pkg.tar.xz", "log",
+                              # another pkgbase being built into the same dir
+                              "other1-1:1.0-1-x86_64.pkg.tar.xz"):
+                with open(os.path.join(build_dir, file_name), "w") as f:
+                    f.write(file_name)
+
+            built_files = package_files_since(build_dir, ["package1", "package2"], "1:1.0-1", build_start)
+            self.assertEqual(["package1-1:1.0-1-x86_64.pkg.tar.xz", "package2-1:1.0-1-any.pkg.tar.xz",
+                              "package2-1:1.0-1-any.pkg.tar.xz.sig"], built_files)
+
+            self.assertFalse(binary_cache.fetch(key, "package1", build_dir))
+            binary_cache.publish(key, build_dir, built_files)
+            self.assertEqual(sorted(built_files), sorted(os.listdir(binary_cache.entry_dir(key))))
+            # no temporary directories left
+            self.assertEqual([os.path.basename(binary_cache.entry_dir(key))],
+                             os.listdir(os.path.dirname(binary_cache.entry_dir(key))))
+
+            other_build_dir = os.path.join(tmp_dir, "other_build")
+            self.assertFalse(binary_cache.fetch(key, "package3", other_build_dir))
+            self.assertTrue(binary_cache.fetch(key, "package2", other_build_dir))
+            self.assertEqual(sorted(built_files), sorted(os.listdir(other_build_dir)))
+            with open(os.path.join(other_build_dir, built_files[0]), "r") as f:
+                self.assertEqual(built_files[0], f.read())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+import threading
+from unittest import TestCase, main
+
+from aurman.build_scheduler import BuildScheduler, ResourceGovernor
+from aurman.classes import Package, PossibleTypes, System
+
+
+def package(name: str, type_of: PossibleTypes, depends=(), pkgbase: str = None, provides=()) -> Package:
+    return Package(name, "1.0-1", list(depends), [], [], list(provides), [], pkgbase or name, makedepends=[],
+                   checkdepends=[], type_of=type_of)
+
+
+class TestBuild_scheduler(TestCase):
+    def test_build_scheduler(self):
+        repo, aur = PossibleTypes.REPO_PACKAGE, PossibleTypes.AUR_PACKAGE
+        chunks = [[package("lib1", repo)], [package("aur1", aur, ["lib1>=1.0"])], [package("aur2", aur)],
+                  [package("repo2", repo, provides=["virtual"])], [package("aur3", aur, ["aur1"])],
+                  [package("aur4", aur, pkgbase="aur1")], [package("aur5", aur, ["installed1"])]]
+        # installed1 depends on something provided by repo2
+        installed_system = System([package("installed1", repo, ["virtual"])])
+
+        scheduler = BuildScheduler(chunks, installed_system, 3)
+        # aur4 is a split package of aur1, hence built by the build of aur1
+        self.assertEqual({1: 0, 2: -1, 4: 1, 6: 3}, scheduler.build_after)
+        self.assertEqual({5: 1}, scheduler.built_by)
+        # aur3 needs aur1 to be installed, the other aur packages need no earlier chunk of their transaction
+        self.assertEqual([[0], [1, 2], [3], [4, 5, 6]], scheduler.install_batches)
+
+        lock = threading.Lock()
+        installed = []
+        transactions = []
+        built = set()
+        installed_when_built = {}
+
+        def build(package_to_build: Package, log_file: str, jobs: int):
+            self.assertIsNotNone(log_file)
+            self.assertIsNotNone(jobs)
+            with lock:
+                self.assertNotIn(package_to_build.pkgbase, built)
+                installed_when_built[package_to_build.name] = set(installed)
+                built.add(package_to_build.pkgbase)
+
+        def install(chunk):
+            with lock:
+                transactions.append(len(chunk))
+                for package_to_install in chunk:
+                    if package_to_install.type_of is aur:
+                        self.assertIn(package_to_install.pkgbase, built)
+                    installed.append(package_to_install.name)
+
+        scheduler.run(build, install)
+        self.assertEqual(["lib1", "aur1", "aur2", "repo2", "aur3", "aur4", "aur5"], installed)
+        self.assertEqual([1, 2, 1, 3], transactions)
+        self.assertIn("lib1", installed_when_built["aur1"])
+        self.assertIn("aur1", installed_when_built["aur3"])
+        self.assertIn("repo2", installed_when_built["aur5"])
+
+    def test_split_packages(self):
+        aur = PossibleTypes.AUR_PACKAGE
+        chunks = [[package("base1", aur)], [package("base1-docs", aur, ["base1"], pkgbase="base1")],
+                  [package("aur2", aur, ["base1-docs"])]]
+        scheduler = BuildScheduler(chunks, System([]))
+        # the split packages are built once and installed at once
+        self.assertEqual({0: -1, 2: 1}, scheduler.build_after)
+        self.assertEqual([[0, 1], [2]], scheduler.install_batches)
+
+        built = []
+        installed = []
+        scheduler.run(lambda package_to_build, log_file, jobs: built.append(package_to_build.name),
+                      lambda chunk: installed.append([package_to_install.name for package_to_install in chunk]))
+        self.assertEqual(["base1", "aur2"], built)
+        self.assertEqual([["base1", "base1-docs"], ["aur2"]], installed)
+
+    def test_install_batches_conflicts(self):
+        aur = PossibleTypes.AUR_PACKAGE
+        aur2 = package("aur2", aur)
+        aur2.conflicts = ["aur1"]
+        chunks = [[package("aur1", aur)], [aur2], [package("aur3", aur)]]
+        # conflicting packages are not installed at once
+        self.assertEqual([[0], [1, 2]], BuildScheduler(chunks, System([])).install_batches)
+
+    def test_pipelined_build_scheduler(self):
+        aur = PossibleTypes.AUR_PACKAGE
+        chunks = [[package("aur1", aur)], [package("aur2", aur, ["aur1"])], [package("aur3", aur)]]
+        scheduler = BuildScheduler(chunks, System([]), pipelined=True)
+        self.assertEqual([[0], [1, 2]], scheduler.install_batches)
+
+        aur3_built = threading.Event()
+        installed = []
+        built_while_installing = []
+
+        def build(package_to_build: Package, log_file: str, jobs: int):
+            # the configured MAKEFLAGS are used, since there is only one build at a time
+            self.assertIsNone(jobs)
+            if package_to_build.name == "aur3":
+                aur3_built.set()
+
+        def install(chunk):
+            # the build of aur3 does not need aur1, hence it is being built while aur1 is being installed
+            if chunk[0].name == "aur1":
+                built_while_installing.append(aur3_built.wait(5))
+            installed.extend(package_to_install.name for package_to_install in chunk)
+
+        scheduler.run(build, install)
+        self.assertEqual(["aur1", "aur2", "aur3"], installed)
+        self.assertEqual([True], built_while_installing)
+
+    def test_resource_governor(self):
+        governor = ResourceGovernor(cores=32, memory_per_core=0)
+        # the cores are shared between the builds which may run concurrently
+        self.assertEqual(8, governor.acquire(10, 4, 0))
+        self.assertEqual(8, governor.acquire(9, 4, 1))
+        governor.release(8)
+        governor.release(8)
+        # a single build left gets all cores
+        self.assertEqual(32, governor.acquire(1, 4, 0))
+        self.assertIsNone(governor.acquire(1, 4, 1))
+        governor.release(32)
+
+        # not enough memory, but the first build is always admitted
+        governor = ResourceGovernor(cores=4, memory_per_core=2 ** 40)
+        self.assertEqual(2, governor.acquire(2, 2, 0))
+        self.assertIsNone(governor.acquire(1, 2, 1))
+
+    def test_resource_governor_reserves_memory(self):
+        # builds admitted back to back have not allocated their memory yet
+        governor = ResourceGovernor(cores=4, memory_per_core=1000)
+        governor.memory_available = lambda: 3000
+        self.assertEqual(1, governor.acquire(4, 4, 0))
+        self.assertEqual(1, governor.acquire(3, 4, 1))
+        self.assertEqual(1, governor.acquire(2, 4, 2))
+        self.assertIsNone(governor.acquire(1, 4, 3))
+        governor.release(1)
+        self.assertEqual(1, governor.acquire(1, 4, 2))
+
+
+if __name__ == '__main__':
+    main()
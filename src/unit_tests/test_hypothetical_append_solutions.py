@@ -0,0 +1,32 @@
+from unittest import TestCase, main
+
+from aurman.classes import Package, PossibleTypes, System
+
+
+def package(name: str, version: str = "1.0-1", depends=(), conflicts=()) -> Package:
+    return Package(name, version, list(depends), list(conflicts), [], [], [], name, type_of=PossibleTypes.REPO_PACKAGE)
+
+
+class TestHypothetical_append_solutions(TestCase):
+    def test_hypothetical_append_solutions_to_system(self):
+        installed_system = System([package("installed1"), package("installed2", depends=["installed1"]),
+                                   package("installed3")])
+        solutions = [[package("new1")],
+                     # removes installed1 and installed2, since its deps are not fulfilled anymore
+                     [package("new2", conflicts=["installed1"])],
+                     [package("installed3", "2.0-1"), package("new3", depends=["installed3"])],
+                     []]
+
+        serial_systems = [installed_system.hypothetical_append_packages_to_system(solution) for solution in solutions]
+        parallel_systems = installed_system.hypothetical_append_solutions_to_system(solutions)
+
+        self.assertEqual(len(serial_systems), len(parallel_systems))
+        for serial_system, parallel_system in zip(serial_systems, parallel_systems):
+            self.assertEqual({(name, installed.version) for name, installed in serial_system.all_packages_dict.items()},
+                             {(name, installed.version) for name, installed in parallel_system.all_packages_dict.items()})
+        self.assertEqual({"installed3", "new2"}, set(parallel_systems[1].all_packages_dict))
+        self.assertEqual("2.0-1", parallel_systems[2].all_packages_dict["installed3"].version)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,25 @@
+import os
+import tempfile
+from unittest import TestCase, main
+
+from aurman.install_reasons import InstallReasonJournal
+
+
+class TestInstall_reason_journal(TestCase):
+    def test_install_reason_journal(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            journal = InstallReasonJournal(os.path.join(tmp_dir, "cache", "aurman_install_reasons"))
+            self.assertEqual([], journal.pending())
+
+            journal.add([])
+            self.assertFalse(os.path.exists(journal.path))
+
+            journal.add(["package1", "package2"])
+            journal.add(name for name in ("package3", "package1"))
+            # the journal survives the process
+            self.assertEqual(["package1", "package2", "package3"],
+                             InstallReasonJournal(journal.path).pending())
+
+
+if __name__ == '__main__':
+    main()
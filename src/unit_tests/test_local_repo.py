@@ -0,0 +1,54 @@
+import os
+import stat
+from subprocess import run, DEVNULL
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from aurman.classes import Package, PossibleTypes
+
+
+class TestLocal_repo(TestCase):
+    def test_add_to_local_repo(self):
+        default_cache_dir, default_path = Package.cache_dir, os.environ["PATH"]
+        with TemporaryDirectory() as tmp_dir:
+            Package.cache_dir = os.path.join(tmp_dir, "cache")
+            Package.local_repo = os.path.join(tmp_dir, "repo", "aurman.db.tar.gz")
+            try:
+                # repo-add writing its arguments to a file
+                bin_dir = os.path.join(tmp_dir, "bin")
+                os.makedirs(bin_dir)
+                with open(os.path.join(bin_dir, "repo-add"), "w") as f:
+                    f.write("#!/bin/sh\nprintf '%s\\n' \"$@\" > '{}'\n".format(os.path.join(tmp_dir, "repo_add_args")))
+                os.chmod(os.path.join(bin_dir, "repo-add"), stat.S_IRWXU)
+                os.environ["PATH"] = "{}:{}".format(bin_dir, default_path)
+
+                package_dir = os.path.join(Package.cache_dir, "base1")
+                os.makedirs(package_dir)
+                with open(os.path.join(package_dir, ".SRCINFO"), "w") as f:
+                    f.write("pkgbase = base1\n\tpkgver = 1.0\n\tpkgrel = 1\n\npkgname = package1\n")
+                open(os.path.join(package_dir, "PKGBUILD"), "w").close()
+                run("git init -q && git add . && git -c user.name=aurman -c user.email=aurman commit -qm init",
+                    shell=True, cwd=package_dir, stdout=DEVNULL, stderr=DEVNULL)
+
+                file_names = ["package1-1.0-1-x86_64.pkg.tar.xz", "package1-1.0-1-x86_64.pkg.tar.xz.sig",
+                              "other1-1.0-1-x86_64.pkg.tar.xz"]
+                for file_name in file_names:
+                    with open(os.path.join(package_dir, file_name), "w") as f:
+                        f.write(file_name)
+
+                package = Package("package1", "1.0-1", [], [], [], [], [], "base1", type_of=PossibleTypes.AUR_PACKAGE)
+                package.add_to_local_repo(package_dir, file_names)
+
+                # files of other pkgbases are neither copied nor added
+                repo_dir = os.path.dirname(Package.local_repo)
+                self.assertEqual(sorted(file_names[:2]), sorted(os.listdir(repo_dir)))
+                with open(os.path.join(tmp_dir, "repo_add_args"), "r") as f:
+                    self.assertEqual(["-R", Package.local_repo, os.path.join(repo_dir, file_names[0])],
+                                     f.read().splitlines())
+            finally:
+                Package.cache_dir, Package.local_repo = default_cache_dir, None
+                os.environ["PATH"] = default_path
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from aurman.classes import Package, PossibleTypes, System
+from aurman.own_exceptions import InvalidInput
+from aurman.package_index import PackageIndex, write_package_index, string_fields, list_fields
+
+
+def record(name: str, **fields) -> dict:
+    to_return = {field: None for field in string_fields + list_fields}
+    to_return.update(name=name, version="1.0-1", type_of=PossibleTypes.REPO_PACKAGE.name)
+    to_return.update(fields)
+    return to_return
+
+
+class TestPackage_index(TestCase):
+    def test_round_trip(self):
+        records = [record("zsh", depends=[], provides=["sh"], repo="extra"),
+                   record("bash", depends=["glibc", "readline>=8"], provides=["sh"], conflicts=["bash-git"]),
+                   record("bäsh-git", pkgbase="bäsh", provides=["bash", "sh"], conflicts=["bash"],
+                          type_of=PossibleTypes.AUR_PACKAGE.name)]
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index")
+            write_package_index(path, ("key", 1), records, {"sh": [0, 1, 2], "bash": [2]},
+                                {"bash": [2], "bash-git": [1]})
+            index = PackageIndex(path)
+
+            self.assertEqual(("key", 1), index.key)
+            self.assertEqual(3, len(index))
+            for expected in records:
+                record_id = index.find(expected["name"])
+                self.assertNotEqual(-1, record_id)
+                self.assertEqual(expected, index.record(record_id))
+            # None and empty lists are being kept apart
+            self.assertEqual([], index.record(index.find("zsh"))["depends"])
+            self.assertIsNone(index.record(index.find("zsh"))["conflicts"])
+            self.assertEqual(-1, index.find("fish"))
+
+            self.assertEqual({"bash", "bäsh-git", "zsh"}, {index.name(i) for i in index.providing("sh")})
+            self.assertEqual(["bäsh-git"], [index.name(i) for i in index.providing("bash")])
+            self.assertEqual(["bäsh-git"], [index.name(i) for i in index.conflicting("bash")])
+            self.assertEqual([], index.providing("fish"))
+            self.assertEqual({"bash", "sh"}, set(index.provided_names()))
+            self.assertEqual({"bash", "bash-git"}, set(index.conflicting_names()))
+
+    def test_empty_index(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "index")
+            write_package_index(path, None, [], {}, {})
+            index = PackageIndex(path)
+            self.assertEqual(0, len(index))
+            self.assertEqual(-1, index.find("bash"))
+            self.assertEqual([], index.providing("sh"))
+            self.assertEqual([], index.provided_names())
+
+    def test_mapped_system(self):
+        packages = [Package("bash", "5.0-1", ["glibc"], [], [], ["sh"], [], "bash", type_of=PossibleTypes.REPO_PACKAGE),
+                    Package("glibc", "2.28-1", [], [], [], [], [], "glibc", type_of=PossibleTypes.REPO_PACKAGE),
+                    Package("bäsh-git", "5.1-1", [], ["bash"], [], ["bash", "sh"], [], "bäsh",
+                            type_of=PossibleTypes.DEVEL_PACKAGE)]
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot")
+            System(packages).save_snapshot(path, ("key",))
+            self.assertIsNone(System.load_snapshot(path, ("other key",)))
+            system = System.load_snapshot(path, ("key",))
+
+            self.assertEqual({"bash", "glibc", "bäsh-git"}, set(system.all_packages_dict))
+            self.assertEqual({"bash", "bäsh-git"}, {package.name for package in system.provides_dict["sh"]})
+            self.assertEqual(["bäsh-git"], [package.name for package in system.conflicts_dict["bash"]])
+
+            del system.all_packages_dict["bash"]
+            del system.provides_dict["sh"]
+            self.assertNotIn("sh", system.provides_dict)
+            self.assertNotIn("sh", set(system.provides_dict))
+            with self.assertRaises(KeyError):
+                del system.provides_dict["sh"]
+            system.all_packages_dict["zsh"] = Package("zsh", "5.6-1", [], [], [], [], [], "zsh",
+                                                      type_of=PossibleTypes.REPO_PACKAGE)
+            self.assertEqual(["glibc"], [package.name for package in system.repo_packages_list])
+            self.assertEqual(["bäsh-git"], [package.name for package in system.devel_packages_list])
+
+            system.provides_dict["sh"] = [system.all_packages_dict["zsh"]]
+            self.assertEqual(["zsh"], [package.name for package in system.provides_dict["sh"]])
+
+    def test_mapped_system_append_packages(self):
+        packages = [Package("bash", "5.0-1", [], [], [], ["sh"], [], "bash", type_of=PossibleTypes.REPO_PACKAGE),
+                    Package("f-git", "1.0-1", [], [], [], [], [], "f-git", type_of=PossibleTypes.DEVEL_PACKAGE)]
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot")
+            System(packages).save_snapshot(path, ("key",))
+
+            # appended before and after the lists have been materialized
+            for materialize_first in (False, True):
+                system = System.load_snapshot(path, ("key",))
+                if materialize_first:
+                    self.assertEqual(["f-git"], [package.name for package in system.devel_packages_list])
+                system.append_packages([Package("g-git", "1.0-1", [], [], [], ["sh"], [], "g-git",
+                                                type_of=PossibleTypes.DEVEL_PACKAGE)])
+
+                self.assertEqual(["f-git", "g-git"], [package.name for package in system.devel_packages_list])
+                self.assertEqual(["bash"], [package.name for package in system.repo_packages_list])
+                self.assertEqual({"bash", "g-git"}, {package.name for package in system.provides_dict["sh"]})
+                with self.assertRaises(InvalidInput):
+                    system.append_packages([Package("bash", "5.1-1", [], [], [], [], [], "bash",
+                                                    type_of=PossibleTypes.REPO_PACKAGE)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from aurman.classes import Package, PossibleTypes, System
+from aurman.pacman_db import parse_desc, package_from_desc
+
+string_attributes = ('name', 'version', 'pkgbase', 'install_reason', 'repo')
+list_attributes = ('depends', 'conflicts', 'optdepends', 'provides', 'replaces', 'makedepends', 'checkdepends',
+                   'groups')
+
+
+class TestPackage_memory(TestCase):
+    def assertCompact(self, package: Package):
+        # no per instance dict, see Package.__slots__
+        self.assertFalse(hasattr(package, "__dict__"))
+        for attribute in string_attributes:
+            value = getattr(package, attribute)
+            if value is not None:
+                self.assertIs(sys.intern(value), value, attribute)
+        for attribute in list_attributes:
+            values = getattr(package, attribute)
+            if values is not None:
+                self.assertIs(tuple, type(values), attribute)
+                for value in values:
+                    self.assertIs(sys.intern(value), value, attribute)
+
+    def test_package_from_desc(self):
+        # the strings are built at runtime, so that they are not interned by the compiler
+        content = "".join(["%NAME%\n", "package", "1\n\n%VERSION%\n1.0-1\n\n%DEPENDS%\n", "dep", "1\ndep2>=1.0\n\n",
+                           "%PROVIDES%\nprov", "ided\n\n%OPTDEPENDS%\nopt1: for more features\n\n%REASON%\n1\n"])
+        package = Package(type_of=PossibleTypes.REPO_PACKAGE, **package_from_desc(parse_desc(content)))
+        self.assertCompact(package)
+        self.assertEqual(("dep1", "dep2>=1.0"), package.depends)
+        self.assertEqual(("opt1",), package.optdepends)
+
+        # same names of different packages are the same objects
+        other = Package(type_of=PossibleTypes.REPO_PACKAGE,
+                        **package_from_desc(parse_desc(content.replace("package1", "package2"))))
+        self.assertIs(package.depends[0], other.depends[0])
+        self.assertIs(package.provides[0], other.provides[0])
+
+    def test_package_from_expac_fields(self):
+        # lazy fields as returned by expac, whitespace separated
+        package = Package("".join(["package", "1"]), "1.0-1", "dep1 dep2".split(), [], "".join(["opt1 ", "opt2"]),
+                          "provided", "", "package1", type_of=PossibleTypes.REPO_PACKAGE, repo="".join(["ext", "ra"]),
+                          groups="group1 group2")
+        self.assertCompact(package)
+        self.assertEqual(("opt1", "opt2"), package.optdepends)
+        self.assertEqual((), package.replaces)
+
+    def test_package_from_snapshot(self):
+        packages = [Package("package1", "1.0-1", ["dep1"], ["package2"], [], ["provided"], [], "package1",
+                            type_of=PossibleTypes.AUR_PACKAGE, makedepends=["make1"], checkdepends=[]),
+                    Package("package2", "1.0-1", ["dep1"], [], None, [], None, "package2",
+                            type_of=PossibleTypes.REPO_PACKAGE, install_reason="explicit")]
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "snapshot")
+            System(packages).save_snapshot(path, ("key",))
+            system = System.load_snapshot(path, ("key",))
+            for name in ("package1", "package2"):
+                self.assertCompact(system.all_packages_dict[name])
+            self.assertIs(system.all_packages_dict["package1"].depends[0],
+                          system.all_packages_dict["package2"].depends[0])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,31 @@
+from unittest import TestCase, main
+
+from aurman.pacman_db import parse_desc, package_from_desc
+
+
+class TestParse_desc(TestCase):
+    def test_parse_desc(self):
+        content = "%NAME%\npackage1\n\n%VERSION%\n1:1.0-2\n\n%DESC%\n%not a field%\n\n" \
+                  "%DEPENDS%\ndep1\ndep2>=1.0\n\n%CONFLICTS%\npackage1\nother\n\n" \
+                  "%OPTDEPENDS%\nopt1: for more features\nopt2>=2: for even more features\n\n%REASON%\n1\n"
+        fields = parse_desc(content)
+        self.assertEqual(["package1"], fields["NAME"])
+        self.assertEqual(["%not a field%"], fields["DESC"])
+        self.assertEqual(["dep1", "dep2>=1.0"], fields["DEPENDS"])
+
+        package = package_from_desc(fields)
+        self.assertEqual("package1", package['name'])
+        self.assertEqual("1:1.0-2", package['version'])
+        self.assertEqual("package1", package['pkgbase'])
+        self.assertEqual(["other"], package['conflicts'])
+        self.assertEqual(["opt1", "opt2>=2"], package['optdepends'])
+        self.assertEqual([], package['provides'])
+        self.assertEqual("dependency", package['install_reason'])
+
+        package = package_from_desc(parse_desc("%NAME%\npackage2\n\n%VERSION%\n1.0-1\n\n%BASE%\nbase\n"))
+        self.assertEqual("base", package['pkgbase'])
+        self.assertEqual("explicit", package['install_reason'])
+
+
+if __name__ == '__main__':
+    main()
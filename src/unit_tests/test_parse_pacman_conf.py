@@ -0,0 +1,20 @@
+from unittest import TestCase, main
+
+from aurman.parsing_config import parse_pacman_conf
+
+
+class TestParse_pacman_conf(TestCase):
+    def test_parse_pacman_conf(self):
+        output = "[options]\nRootDir = /\nDBPath = /var/lib/pacman/\nHoldPkg = pacman\nHoldPkg = glibc\n" \
+                 "VerbosePkgLists\n[core]\nUsage = All\nServer = https://mirror/core\n[extra]\nUsage = All\n"
+        options, repos = parse_pacman_conf(output)
+        self.assertEqual(["core", "extra"], repos)
+        self.assertEqual(["pacman", "glibc"], options["HoldPkg"])
+        self.assertEqual(["/var/lib/pacman/"], options["DBPath"])
+        self.assertEqual([""], options["VerbosePkgLists"])
+        self.assertNotIn("Usage", options)
+        self.assertNotIn("IgnorePkg", options)
+
+
+if __name__ == '__main__':
+    main()
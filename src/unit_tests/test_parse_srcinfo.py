@@ -0,0 +1,43 @@
+import os
+from subprocess import run, DEVNULL
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+from aurman.classes import Package, PossibleTypes
+from aurman.utilities import parse_srcinfo
+
+
+class TestParse_srcinfo(TestCase):
+    def test_parse_srcinfo(self):
+        lines = "pkgbase = gunnar\n\tpkgver = 1.0\n\tpkgrel = 2\n\tepoch = 1\n\tdepends = dep1\n\tdepends = dep2>=1\n\n" \
+                "pkgname = gunnar\n\tpkgver = 3.0\n\npkgname = gunnar-docs\n".splitlines()
+        fields = parse_srcinfo(lines)
+        self.assertEqual(["gunnar"], fields["pkgbase"])
+        self.assertEqual(["1.0"], fields["pkgver"])
+        self.assertEqual(["2"], fields["pkgrel"])
+        self.assertEqual(["1"], fields["epoch"])
+        self.assertEqual(["dep1", "dep2>=1"], fields["depends"])
+        self.assertNotIn("pkgname", fields)
+
+    def test_srcinfo_of_package(self):
+        default_cache_dir = Package.cache_dir
+        with TemporaryDirectory() as cache_dir:
+            Package.cache_dir = cache_dir
+            try:
+                package_dir = os.path.join(cache_dir, "gunnar")
+                os.makedirs(package_dir)
+                with open(os.path.join(package_dir, ".SRCINFO"), "w") as f:
+                    f.write("pkgbase = gunnar\n\tpkgver = 1.0\n\tpkgrel = 2\n\npkgname = gunnar\n\npkgname = gunnar-docs\n")
+                open(os.path.join(package_dir, "PKGBUILD"), "w").close()
+                run("git init -q && git add . && git -c user.name=aurman -c user.email=aurman commit -qm init",
+                    shell=True, cwd=package_dir, stdout=DEVNULL, stderr=DEVNULL)
+
+                package = Package("gunnar-docs", "1.0-2", [], [], [], [], [], "gunnar", type_of=PossibleTypes.AUR_PACKAGE)
+                self.assertEqual("1.0-2", package.version_from_srcinfo())
+                self.assertEqual(["gunnar", "gunnar-docs"], package.pkgnames_from_srcinfo())
+            finally:
+                Package.cache_dir = default_cache_dir
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+from unittest import TestCase, main
+
+from aurman.classes import Package, PossibleTypes, System
+
+
+def package(name: str, type_of: PossibleTypes, depends=(), conflicts=()) -> Package:
+    return Package(name, "1.0-1", list(depends), list(conflicts), [], [], [], name, makedepends=[], checkdepends=[],
+                   type_of=type_of)
+
+
+class TestReorder_for_install_chunks(TestCase):
+    def test_reorder_for_install_chunks(self):
+        repo, aur = PossibleTypes.REPO_PACKAGE, PossibleTypes.AUR_PACKAGE
+        packages = [package("repo1", repo), package("aur1", aur, ["repo1"]), package("repo2", repo),
+                    package("aur2", aur, ["aur1"]), package("repo3", repo), package("repo4", repo, ["aur2"])]
+        reordered = System([]).reorder_for_install_chunks(packages)
+
+        self.assertEqual(["repo1", "repo2", "repo3", "aur1", "aur2", "repo4"],
+                         [package_to_install.name for package_to_install in reordered])
+        self.assertEqual(4, len(System.calc_install_chunks(reordered)))
+        self.assertEqual(5, len(System.calc_install_chunks(packages)))
+
+    def test_reorder_for_install_chunks_conflicts(self):
+        repo, aur = PossibleTypes.REPO_PACKAGE, PossibleTypes.AUR_PACKAGE
+        # repo2 replaces the installed package installed1, hence it keeps its order relative to aur packages
+        packages = [package("repo1", repo), package("aur1", aur), package("repo2", repo, conflicts=["installed1"])]
+        reordered = System([package("installed1", repo)]).reorder_for_install_chunks(packages)
+
+        self.assertEqual(["repo1", "aur1", "repo2"], [package_to_install.name for package_to_install in reordered])
+
+
+if __name__ == '__main__':
+    main()
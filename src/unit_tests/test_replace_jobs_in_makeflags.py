@@ -0,0 +1,19 @@
+from unittest import TestCase, main
+
+from aurman.parsing_config import replace_jobs_in_makeflags
+
+
+class TestReplace_jobs_in_makeflags(TestCase):
+    def test_replace_jobs_in_makeflags(self):
+        self.assertEqual("-j4", replace_jobs_in_makeflags(None, 4))
+        self.assertEqual("-j4", replace_jobs_in_makeflags("", 4))
+        self.assertEqual("-l6 -j2", replace_jobs_in_makeflags("-j8 -l6", 2))
+        self.assertEqual("--load-average=6 -j2", replace_jobs_in_makeflags("--jobs=8 --load-average=6", 2))
+        self.assertEqual("-l6 -j2", replace_jobs_in_makeflags("-j 8 -l6", 2))
+        self.assertEqual("-l6 -j2", replace_jobs_in_makeflags("--jobs 8 -l6", 2))
+        # -j without a number means unlimited jobs
+        self.assertEqual("-l6 -j2", replace_jobs_in_makeflags("-j -l6", 2))
+
+
+if __name__ == '__main__':
+    main()
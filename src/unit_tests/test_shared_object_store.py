@@ -0,0 +1,63 @@
+import os
+from subprocess import run, DEVNULL, PIPE
+from tempfile import TemporaryDirectory
+from unittest import TestCase, main
+
+import aurman.aur_utilities
+from aurman.classes import Package
+
+
+def create_aur_repo(aur_dir: str, pkgbase: str):
+    work_dir = os.path.join(aur_dir, "{}_work".format(pkgbase))
+    os.makedirs(work_dir)
+    with open(os.path.join(work_dir, "PKGBUILD"), "w") as f:
+        f.write("pkgname={}\n".format(pkgbase))
+    run("git init -q && git add PKGBUILD && git -c user.name=aurman -c user.email=aurman@localhost commit -qm init "
+        "&& git clone -q --bare . '{}'".format(os.path.join(aur_dir, "{}.git".format(pkgbase))), shell=True,
+        stdout=DEVNULL, stderr=DEVNULL, cwd=work_dir, check=True)
+
+
+def count_objects(repo_dir: str) -> int:
+    # objects in the repo itself, borrowed objects are not counted
+    output = run("git count-objects -v", shell=True, stdout=PIPE, universal_newlines=True, cwd=repo_dir).stdout
+    counts = dict(line.split(": ") for line in output.strip().splitlines())
+    return int(counts["count"]) + int(counts["in-pack"])
+
+
+class TestShared_object_store(TestCase):
+    def test_shared_object_store(self):
+        old_values = (aurman.aur_utilities.aur_domain, Package.cache_dir, Package.shared_object_store)
+
+        try:
+            with TemporaryDirectory() as directory:
+                # local bare repos stand in for the aur
+                aur_dir = os.path.join(directory, "aur")
+                for pkgbase in ("package1", "package2"):
+                    create_aur_repo(aur_dir, pkgbase)
+
+                aurman.aur_utilities.aur_domain = aur_dir
+                Package.cache_dir = os.path.join(directory, "cache")
+                Package.shared_object_store = True
+
+                Package.fetch_pkgbuilds([Package("package1", "1.0-1", pkgbase="package1"),
+                                         Package("package2", "1.0-1", pkgbase="package2")])
+
+                store_dir = os.path.join(Package.cache_dir, Package.shared_object_store_name)
+                for pkgbase in ("package1", "package2"):
+                    package_dir = os.path.join(Package.cache_dir, pkgbase)
+                    self.assertTrue(os.path.isfile(os.path.join(package_dir, "PKGBUILD")))
+                    self.assertEqual(0, count_objects(package_dir))
+                    self.assertEqual(0, run("git fsck", shell=True, stdout=DEVNULL, cwd=package_dir).returncode)
+
+                Package.prune_shared_object_store({"package1"})
+                refs = run("git --git-dir='{}' for-each-ref --format='%(refname)'".format(store_dir), shell=True,
+                           stdout=PIPE, universal_newlines=True).stdout.split()
+                self.assertEqual(["refs/aurman/package1/master"], refs)
+                self.assertEqual(0, run("git fsck", shell=True, stdout=DEVNULL,
+                                        cwd=os.path.join(Package.cache_dir, "package1")).returncode)
+        finally:
+            aurman.aur_utilities.aur_domain, Package.cache_dir, Package.shared_object_store = old_values
+
+
+if __name__ == '__main__':
+    main()